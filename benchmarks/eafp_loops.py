@@ -0,0 +1,200 @@
+"""Benchmark instrumented EAFP loops, at several nesting depths.
+
+Each loop looks up missing keys and catches the KeyError, with the lookup
+nested in a number of statements inside the 'try' body. The report shows the
+call time of the instrumented functions relative to the original ones:
+
+    $ python benchmarks/eafp_loops.py
+
+The last two loops show the cases the instrumentation can't make free: a
+'for' loop or 'with' statement inside the 'try' body, and a KeyError ignored
+by the instrumented callee and caught by its caller.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import types
+import timeit
+
+# Run against the checkout the benchmark is in, rather than an installed copy
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from ipdbugger import debug, overhead  # noqa: E402
+
+
+KEYS = list(range(1000))
+MAPPING = {key: key for key in KEYS[::2]}
+
+
+def lookup_depth_0(mapping, keys):
+    found = 0
+    for key in keys:
+        try:
+            found += mapping[key]
+
+        except KeyError:
+            pass
+
+    return found
+
+
+def lookup_depth_1(mapping, keys):
+    found = 0
+    for key in keys:
+        try:
+            if key >= 0:
+                found += mapping[key]
+
+        except KeyError:
+            pass
+
+    return found
+
+
+def lookup_depth_2(mapping, keys):
+    found = 0
+    for key in keys:
+        try:
+            if key >= 0:
+                if mapping:
+                    found += mapping[key]
+
+        except KeyError:
+            pass
+
+    return found
+
+
+def lookup_depth_3(mapping, keys):
+    found = 0
+    for key in keys:
+        try:
+            if key >= 0:
+                if mapping:
+                    while True:
+                        found += mapping[key]
+                        break
+
+        except KeyError:
+            pass
+
+    return found
+
+
+def lookup_nested_loop(mapping, keys):
+    found = 0
+    try:
+        for key in keys:
+            try:
+                found += mapping[key]
+
+            except KeyError:
+                pass
+
+    except KeyError:
+        pass
+
+    return found
+
+
+class Lookups(object):
+    """Context manager counting the lookups done in it."""
+    count = 0
+
+    def __enter__(self):
+        Lookups.count += 1
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        return False
+
+
+def lookup_loop_with(mapping, keys):
+    found = 0
+    for key in keys:
+        try:
+            for lookup_key in (key,):
+                with Lookups():
+                    found += mapping[lookup_key]
+
+        except KeyError:
+            pass
+
+    return found
+
+
+def get_item(mapping, key):
+    return mapping[key]
+
+
+def get_value(mapping, key):
+    value = get_item(mapping, key)
+    return value
+
+
+def lookup_caught_by_caller(mapping, keys):
+    found = 0
+    for key in keys:
+        try:
+            found += get_value(mapping, key)
+
+        except KeyError:
+            pass
+
+    return found
+
+
+FUNCTIONS = [lookup_depth_0, lookup_depth_1, lookup_depth_2,
+             lookup_depth_3, lookup_nested_loop, lookup_loop_with]
+
+# Callees of lookup_caught_by_caller, whose KeyError they let through
+CALLEES = ["get_value", "get_item"]
+
+
+def copy_function(function, function_globals=None):
+    """Return a new function object running the same code."""
+    return types.FunctionType(function.__code__,
+                              function_globals or function.__globals__,
+                              function.__name__)
+
+
+def measure_caught_by_caller(compact):
+    """Return the call time ratio of a caller whose callees are instrumented.
+
+    Propagating `debug` to the callees would instrument them in place, for
+    the original code `overhead` times too. Instead, only copies of the
+    callees are instrumented, ignoring the KeyError their caller catches.
+    """
+    callees_globals = dict(globals())
+    for name in CALLEES:
+        callees_globals[name] = debug(
+            copy_function(globals()[name], callees_globals),
+            ignore_exceptions=[KeyError], compact=compact)
+
+    caller = copy_function(lookup_caught_by_caller, callees_globals)
+    instrumented_time = min(timeit.repeat(lambda: caller(MAPPING, KEYS),
+                                          number=20, repeat=3))
+    original_time = min(timeit.repeat(
+        lambda: lookup_caught_by_caller(MAPPING, KEYS), number=20, repeat=3))
+
+    return instrumented_time / original_time
+
+
+def main():
+    row_format = "{:<25}{:>11.2f}x{:>11.2f}x"
+    print("{:<25}{:>12}{:>12}".format("function", "statements", "compact"))
+    for function in FUNCTIONS:
+        ratios = [overhead(debug(copy_function(function), compact=compact),
+                           args=(MAPPING, KEYS), number=20).call_ratio
+                  for compact in (False, True)]
+
+        print(row_format.format(function.__name__, *ratios))
+
+    print(row_format.format(lookup_caught_by_caller.__name__,
+                            *[measure_caught_by_caller(compact)
+                              for compact in (False, True)]))
+
+
+if __name__ == "__main__":
+    main()
@@ -19,11 +19,14 @@ from __future__ import absolute_import
 # pylint: disable=no-member,not-callable
 # pylint: disable=protected-access,bare-except
 # pylint: disable=missing-docstring,too-many-locals,too-many-branches
+# pylint: disable=global-statement
 import re
 import ast
 import sys
 import types
 import inspect
+import importlib
+import threading
 import traceback
 from bdb import BdbQuit
 
@@ -32,13 +35,40 @@ from termcolor import colored
 from future.utils import raise_
 from IPython.terminal.debugger import TerminalPdb
 
+from . import cache
+from . import replay
+from .cache import get_transform_key
 from .signals import register_break_signal
+from .context import (debugging_enabled,  # noqa: F401
+                      enabled, disabled, set_enabled_by_default)
+from .introspection import (overhead,  # noqa: F401
+                            InstrumentationOverhead, is_instrumented)
+from .replay import (enable_failure_capture,  # noqa: F401
+                     disable_failure_capture, replay_failure)
 
 # Enable color printing on screen.
 colorama.init()
 
 
 IS_PYTHON_3 = sys.version_info > (3, 0)
+HAS_MONITORING = hasattr(sys, "monitoring")
+# Jumping from an exception handler back into its 'try' block is possible
+# since the blocks are described by exception tables
+CAN_RESUME_INTO_TRY = sys.version_info >= (3, 11)
+EXCEPTHOOK_WRAPPED = False
+
+# Callbacks to run before a session starts, e.g. to stop capturing output
+SESSION_START_CALLBACKS = []
+
+# Debuggers kept for reuse between sessions, one per thread
+DEBUGGERS = threading.local()
+
+# Debugger using the monitoring events, which are shared by all threads
+MONITORING_DEBUGGER = None
+
+GENERATOR_AND_COROUTINE_FLAGS = (getattr(inspect, "CO_GENERATOR", 0) |
+                                 getattr(inspect, "CO_COROUTINE", 0) |
+                                 getattr(inspect, "CO_ASYNC_GENERATOR", 0))
 
 
 class IPDBugger(TerminalPdb):
@@ -47,16 +77,24 @@ class IPDBugger(TerminalPdb):
     def __init__(self, exc_info, *args, **kwargs):
         TerminalPdb.__init__(self, *args, **kwargs)
         self.exc_info = exc_info
+        self.in_session = False
+        self.monitoring = False
+        self.monitoring_thread = None
+        self.monitored_codes = set()
+        self.resume_frame = None
+        self.resume_line = None
 
     def do_raise(self, arg):
         """Raise the last exception caught."""
+        # Continuing ends the session and releases the exception info
+        exc_info = self.exc_info
         self.do_continue(arg)
 
         # Annotating the exception for a continual re-raise
-        _, exc_value, _ = self.exc_info
+        _, exc_value, _ = exc_info
         exc_value._ipdbugger_let_raise = True
 
-        raise_(*self.exc_info)
+        raise_(*exc_info)
 
     def do_retry(self, arg):
         """Rerun the previous command."""
@@ -74,6 +112,36 @@ class IPDBugger(TerminalPdb):
         self.do_continue(arg)
         return 1
 
+    def user_line(self, frame):
+        """Move the frame of a compact handler to the line to resume at.
+
+        Blocks instrumented by the compact engine finish their handler at the
+        end of the block, so the first stop in the frame jumps back to the
+        statement after the failing one.
+        """
+        # Stopping at a breakpoint after continuing starts a session again
+        self.in_session = True
+
+        if frame is self.resume_frame:
+            self.resume_frame = None
+            if self.resume_line is not None:
+                try:
+                    frame.f_lineno = self.resume_line
+
+                except ValueError:
+                    pass
+
+        TerminalPdb.user_line(self, frame)
+
+    def dispatch_return(self, frame, arg):
+        """Handle return action, ending the session with its bottom frame."""
+        if frame is self.botframe:
+            self.end_session()
+            sys.settrace(None)
+            return None
+
+        return TerminalPdb.dispatch_return(self, frame, arg)
+
     def dispatch_line(self, frame):
         """Handle line action and return the next line callback."""
         callback = TerminalPdb.dispatch_line(self, frame)
@@ -84,18 +152,342 @@ class IPDBugger(TerminalPdb):
 
         return callback
 
+    def set_trace(self, frame=None):
+        """Start debugging from frame, using `sys.monitoring` if possible."""
+        if frame is None:
+            frame = sys._getframe().f_back
+
+        self.in_session = True
+
+        # Tracing may still be on for the breakpoints of a previous session,
+        # don't let it trace bdb's own setup
+        sys.settrace(None)
+
+        # A session started while another one steps in this thread, e.g. by
+        # a failing statement, takes over its events as it takes over tracing
+        stepping_debugger = MONITORING_DEBUGGER
+        if stepping_debugger is not None and \
+                stepping_debugger.monitoring_thread == threading.get_ident():
+            stepping_debugger.stop_monitoring()
+        TerminalPdb.set_trace(self, frame)
+
+        # Only switch backends if bdb actually started a session. bdb's trace
+        # function is already active, remove it before calling any Python code
+        if HAS_MONITORING and getattr(self, "botframe", None) is not None:
+            sys.settrace(None)
+            if not self.start_monitoring(frame):
+                sys.settrace(self.trace_dispatch)
+
+    def set_continue(self):
+        """Stop only at breakpoints, leaving no tracing overhead behind."""
+        TerminalPdb.set_continue(self)
+
+        if not self.breaks:
+            self.end_session()
 
-def start_debugging():
+        else:
+            # Keep tracing for the breakpoints, but the session is over
+            self.release_session()
+
+    def set_quit(self):
+        """Stop the debugging session and its monitoring events."""
+        TerminalPdb.set_quit(self)
+        self.end_session()
+
+    def end_session(self):
+        """Release all the references the session holds to frames.
+
+        Frames keep their locals alive, so in long running processes nothing
+        may point to them from the debugger once the session is over.
+        """
+        if self.monitoring:
+            self.stop_monitoring()
+
+        # bdb leaves its trace function on the bottom frame
+        frame = sys._getframe().f_back
+        while frame is not None:
+            if frame.f_trace == self.trace_dispatch:
+                frame.f_trace = None
+
+            frame = frame.f_back
+
+        self.botframe = self.stopframe = self.returnframe = None
+        self.release_session()
+
+    def release_session(self):
+        """Release the exception and frames of the session, to reuse it.
+
+        bdb's bottom and stop frames are kept, since tracing may go on for
+        breakpoints.
+        """
+        exc_value = self.exc_info[1] if self.exc_info else None
+        if exc_value is not None and \
+                getattr(sys, "last_value", None) is exc_value:
+            for name in ("last_type", "last_value",
+                         "last_traceback", "last_exc"):
+                if hasattr(sys, name):
+                    delattr(sys, name)
+
+        self.exc_info = None
+        self.in_session = False
+        self.initial_frame = None
+        self.resume_frame = None
+        self.__dict__.pop("curframe_locals", None)
+
+        # The prompt's completer is given the namespaces of the last frame
+        completer = getattr(getattr(self, "_ptcomp", None), "ipy_completer",
+                            None)
+        if completer is not None:
+            completer.namespace = {}
+            completer.global_namespace = {}
+
+        # Newer IPython versions cache skip decisions by frame
+        for cache_name in ("_skip_cache", "_parent_skip_cache"):
+            getattr(self, cache_name, {}).clear()
+
+    def start_monitoring(self, frame):
+        """Replace bdb's global trace function with `sys.monitoring` events.
+
+        Monitoring events are shared by all threads, so line events are
+        enabled only on the code object of the stepped frame, moving to
+        called and returned-to code objects as the session steps. Other
+        threads pay for the events only while running that code object.
+        Reporting exceptions and stepping out of a frame by an exception
+        need the raise and unwind events, which can only be enabled globally.
+        They cost a callback only for frames an exception passes through.
+        While breakpoints are set, the session goes back to bdb's per-thread
+        trace function, since they may be in any code object.
+
+        Args:
+            frame (frame): frame to start stepping from.
+
+        Returns:
+            bool. whether the monitoring events replaced the trace function.
+        """
+        monitoring = sys.monitoring
+        try:
+            monitoring.use_tool_id(monitoring.DEBUGGER_ID, "ipdbugger")
+
+        except ValueError:
+            # Another debugger already uses sys.monitoring, keep settrace
+            return False
+
+        traced_frame = frame
+        while traced_frame is not None:
+            traced_frame.f_trace = None
+            traced_frame = traced_frame.f_back
+
+        global MONITORING_DEBUGGER
+        MONITORING_DEBUGGER = self
+        self.monitoring = True
+        self.monitoring_thread = threading.get_ident()
+
+        for event, callback in self.get_monitoring_callbacks().items():
+            monitoring.register_callback(monitoring.DEBUGGER_ID, event,
+                                         callback)
+
+        self.update_monitoring(frame)
+        return True
+
+    def get_monitoring_callbacks(self):
+        """Return the callbacks of the monitoring events, by event."""
+        events = sys.monitoring.events
+        return {events.LINE: self.monitor_line,
+                events.CALL: self.monitor_call,
+                events.PY_RETURN: self.monitor_return,
+                events.RAISE: self.monitor_raise,
+                events.PY_UNWIND: self.monitor_unwind}
+
+    def stop_monitoring(self):
+        """Disable all monitoring events and release the tool id."""
+        monitoring = sys.monitoring
+        monitoring.set_events(monitoring.DEBUGGER_ID, 0)
+        for code in self.monitored_codes:
+            monitoring.set_local_events(monitoring.DEBUGGER_ID, code, 0)
+
+        for event in self.get_monitoring_callbacks():
+            monitoring.register_callback(monitoring.DEBUGGER_ID, event, None)
+
+        monitoring.free_tool_id(monitoring.DEBUGGER_ID)
+
+        global MONITORING_DEBUGGER
+        MONITORING_DEBUGGER = None
+        self.monitoring = False
+        self.monitoring_thread = None
+        self.monitored_codes = set()
+
+    def monitor_code(self, code, stepping=False):
+        """Enable line and return events for the given code object.
+
+        Args:
+            code (types.CodeType): code object to monitor.
+            stepping (bool): whether to also enable call events, to step
+                into the functions the code calls.
+        """
+        monitoring = sys.monitoring
+        events = monitoring.events
+        local_events = events.LINE | events.PY_RETURN
+        if stepping:
+            local_events |= events.CALL
+
+        self.monitored_codes.add(code)
+        monitoring.set_local_events(monitoring.DEBUGGER_ID, code,
+                                    local_events)
+
+    def update_monitoring(self, frame):
+        """Adjust the enabled events to the last stepping command.
+
+        Args:
+            frame (frame): frame the session stopped or returned to.
+        """
+        if not self.monitoring or frame is None:
+            return
+
+        if self.stoplineno == -1 or self.breaks:
+            # Breakpoints may be in any code object, trace only this thread
+            self.stop_monitoring()
+            traced_frame = frame
+            while traced_frame is not None:
+                traced_frame.f_trace = self.trace_dispatch
+                if traced_frame is self.botframe:
+                    break
+
+                traced_frame = traced_frame.f_back
+
+            sys.settrace(self.trace_dispatch)
+            return
+
+        monitoring = sys.monitoring
+        for code in self.monitored_codes - {frame.f_code}:
+            monitoring.set_local_events(monitoring.DEBUGGER_ID, code, 0)
+
+        self.monitored_codes = set()
+        self.monitor_code(frame.f_code, stepping=self.stopframe is None)
+
+        # Report exceptions, and follow the stepped frame if one unwinds it
+        monitoring.set_events(monitoring.DEBUGGER_ID,
+                              monitoring.events.RAISE |
+                              monitoring.events.PY_UNWIND)
+
+    def monitor_line(self, _code, _line_number):
+        """Handle a `sys.monitoring` line event, like bdb's dispatch_line."""
+        if threading.get_ident() != self.monitoring_thread:
+            return
+
+        frame = sys._getframe(1)
+        if self.stop_here(frame) or self.break_here(frame):
+            self.user_line(frame)
+            if self.quitting:
+                raise BdbQuit
+
+            self.update_monitoring(frame)
+
+    def monitor_call(self, _code, _instruction_offset, callable_object,
+                     _first_argument):
+        """Handle a `sys.monitoring` call event, to step into the callee."""
+        if threading.get_ident() != self.monitoring_thread or \
+                self.stopframe is not None:
+            return
+
+        # Calling a class runs its __init__
+        if isinstance(callable_object, type):
+            callable_object = callable_object.__init__
+
+        function = getattr(callable_object, "__func__", callable_object)
+        code = getattr(function, "__code__", None)
+        if isinstance(code, types.CodeType):
+            self.monitor_code(code, stepping=True)
+
+    def monitor_return(self, _code, _instruction_offset, retval):
+        """Handle a `sys.monitoring` return event, like bdb's dispatch_return.
+        """
+        if threading.get_ident() != self.monitoring_thread:
+            return
+
+        frame = sys._getframe(1)
+        if frame is self.botframe:
+            # Stepped out of the bottom frame, nothing is left to debug
+            self.end_session()
+            return
+
+        if not (self.stop_here(frame) or frame is self.returnframe):
+            return
+
+        if self.stopframe and \
+                frame.f_code.co_flags & GENERATOR_AND_COROUTINE_FLAGS:
+            return
+
+        try:
+            self.frame_returning = frame
+            self.user_return(frame, retval)
+
+        finally:
+            self.frame_returning = None
+
+        if self.quitting:
+            raise BdbQuit
+
+        if self.stopframe is frame and self.stoplineno != -1:
+            self._set_stopinfo(None, None)
+
+        self.update_monitoring(frame.f_back)
+
+    def monitor_raise(self, _code, _instruction_offset, exception):
+        """Handle a `sys.monitoring` raise event, like bdb's exception event.
+        """
+        if threading.get_ident() != self.monitoring_thread:
+            return
+
+        frame = sys._getframe(1)
+
+        # Stopping on the exception lets the user give a new stepping command
+        stop_info = (self.stopframe, self.returnframe, self.stoplineno)
+        self.dispatch_exception(frame, (type(exception), exception,
+                                        exception.__traceback__))
+
+        if (self.stopframe, self.returnframe, self.stoplineno) != stop_info:
+            self.update_monitoring(frame)
+
+    def monitor_unwind(self, code, instruction_offset, _exception):
+        """Handle a `sys.monitoring` unwind event, like a return event."""
+        self.monitor_return(code, instruction_offset, None)
+
+
+def start_debugging(resume_table=None):
     """Start a debugging session after catching an exception.
 
     This prints the traceback and start ipdb session in the frame of the error.
+
+    Args:
+        resume_table (tuple): lines to resume at after the statements of a
+            compact block fail, see `get_resume_line`.
+
+    Returns:
+        bool. whether the handler should re-raise the exception, since
+            debugging is disabled where it was caught.
     """
+    # Let the exception propagate where debugging is disabled
+    if not debugging_enabled():
+        return True
+
     exc_type, exc_value, exc_tb = sys.exc_info()
 
     # If the exception has been annotated to be re-raised, raise the exception
     if hasattr(exc_value, '_ipdbugger_let_raise'):
         raise_(*sys.exc_info())
 
+    # Capture the failure for an offline replay instead of debugging it
+    if replay.FAILURE_STORE is not None:
+        replay.capture_failure(sys._getframe(1), sys.exc_info())
+        if replay.FAILURE_STORE.reraise:
+            exc_value._ipdbugger_let_raise = True
+            raise_(*sys.exc_info())
+
+        return False
+
+    for callback in SESSION_START_CALLBACKS:
+        callback()
+
     print()
     for line in traceback.format_exception(exc_type, exc_value, exc_tb):
         print(colored(line, 'red'), end=' ')
@@ -103,9 +495,145 @@ def start_debugging():
     # Get the frame with the error.
     test_frame = sys._getframe(-1).f_back
 
-    from ipdb.__main__ import wrap_sys_excepthook
     wrap_sys_excepthook()
-    IPDBugger(exc_info=sys.exc_info()).set_trace(test_frame)
+    debugger = get_debugger(exc_info=sys.exc_info())
+    if resume_table is not None:
+        debugger.resume_frame = test_frame
+        debugger.resume_line = get_resume_line(
+            resume_table, exc_tb.tb_lineno, test_frame.f_code.co_firstlineno)
+
+    debugger.set_trace(test_frame)
+    return False
+
+
+def get_resume_line(resume_table, line_number, code_first_line):
+    """Return the line to resume at after the given line failed.
+
+    The table's lines are relative to the first line of the code holding it,
+    so they stay correct when the code is moved to other lines of its file.
+
+    Args:
+        resume_table (tuple): first line, last line and line to resume at of
+            each statement of a block, nested statements after their parents.
+        line_number (number): line of the failure.
+        code_first_line (number): first line of the failing code object.
+
+    Returns:
+        number. the line to resume at, None to continue past the block.
+    """
+    line_offset = line_number - code_first_line
+    resume_offset = None
+    for first_offset, last_offset, statement_resume_offset in resume_table:
+        if first_offset <= line_offset <= last_offset:
+            resume_offset = statement_resume_offset
+
+    if resume_offset is None:
+        return None
+
+    return code_first_line + resume_offset
+
+
+def get_debugger(exc_info):
+    """Return the thread's debugger, initialized for a new session.
+
+    Creating a TerminalPdb builds its prompt session, history and color
+    schemes, so each thread reuses one debugger between sessions. A new one
+    is created only for sessions nested in an active one.
+
+    Args:
+        exc_info (tuple): exception info of the session.
+
+    Returns:
+        IPDBugger. debugger to start the session with.
+    """
+    debugger = getattr(DEBUGGERS, "debugger", None)
+    if debugger is not None and not debugger.in_session:
+        debugger.exc_info = exc_info
+        return debugger
+
+    debugger = IPDBugger(exc_info=exc_info)
+    if not hasattr(DEBUGGERS, "debugger"):
+        DEBUGGERS.debugger = debugger
+
+    return debugger
+
+
+def wrap_sys_excepthook():
+    """Wrap the system's excepthook with ipdb's hook, only once."""
+    global EXCEPTHOOK_WRAPPED
+    if EXCEPTHOOK_WRAPPED:
+        return
+
+    EXCEPTHOOK_WRAPPED = True
+
+    from ipdb.__main__ import wrap_sys_excepthook as wrap_ipdb_excepthook
+    wrap_ipdb_excepthook()
+
+
+def get_none_node():
+    """Return an ast node representing the `None` constant."""
+    if sys.version_info >= (3, 8):
+        return ast.Constant(None)
+
+    if IS_PYTHON_3:
+        return ast.NameConstant(None)
+
+    return ast.Name("None", ast.Load())
+
+
+def get_string_node(value):
+    """Return an ast node representing the string constant."""
+    if sys.version_info >= (3, 8):
+        return ast.Constant(value)
+
+    return ast.Str(value)
+
+
+def get_ipdbugger_node(name):
+    """Return an ast node looking up an attribute of ipdbugger.
+
+    The module is looked up where the node runs, rather than imported by the
+    instrumented function on each call.
+
+    Args:
+        name (str): name of the attribute.
+    """
+    call_extra_parameters = [] if IS_PYTHON_3 else [None, None]
+    import_call = ast.Call(ast.Name("__import__", ast.Load()),
+                           [get_string_node(__name__)], [],
+                           *call_extra_parameters)
+
+    return ast.Attribute(import_call, name, ast.Load())
+
+
+def get_exception_class_node(exception_class):
+    """Return an ast node looking up the exception class by its names.
+
+    Args:
+        exception_class (type): class of the exception.
+    """
+    call_extra_parameters = [] if IS_PYTHON_3 else [None, None]
+    return ast.Call(get_ipdbugger_node("get_exception_class"),
+                    [get_string_node(exception_class.__module__),
+                     get_string_node(exception_class.__name__)], [],
+                    *call_extra_parameters)
+
+
+def get_exception_class(module_name, class_name):
+    """Return the current exception class of the given names.
+
+    Args:
+        module_name (str): name of the module defining the class.
+        class_name (str): name of the class.
+
+    Returns:
+        type. the exception class.
+    """
+    module = sys.modules.get(module_name)
+    if module is None:
+        module = importlib.import_module(module_name)
+
+    return getattr(module, class_name)
 
 
 def get_node_value(ast_node):
@@ -116,26 +644,72 @@ def get_node_value(ast_node):
 class ErrorsCatchTransformer(ast.NodeTransformer):
     """Surround each statement with a try/except block to catch errors."""
 
+    # Statements compiled to code objects of their own
+    CODE_STATEMENTS = tuple(getattr(ast, name) for name in
+                            ("FunctionDef", "AsyncFunctionDef", "ClassDef")
+                            if hasattr(ast, name))
+
     def __init__(self, ignore_exceptions=(), catch_exception=None, depth=0):
         self.depth = depth
+        self.injected_tries = 0
+        self.code_first_line = 0
         self.catch_exception = None
         self.ignore_exceptions = None
 
         if ignore_exceptions is not None:
             self.ignore_exceptions = [
-                ast.Name(exception_class.__name__, ast.Load())
+                get_exception_class_node(exception_class)
                 for exception_class in ignore_exceptions]
 
         if catch_exception is not None:
-            self.catch_exception = ast.Name(catch_exception.__name__,
-                                            ast.Load())
+            self.catch_exception = get_exception_class_node(
+                catch_exception)
+
+    def visit(self, node):
+        """Visit a node, keeping the first line of the code it's compiled in.
+
+        Args:
+            node (ast.AST): node to visit.
+        """
+        if not isinstance(node, self.CODE_STATEMENTS):
+            return super(ErrorsCatchTransformer, self).visit(node)
+
+        return self.visit_code(node,
+                               super(ErrorsCatchTransformer, self).visit)
+
+    def visit_code(self, node, visit_node):
+        """Visit a definition compiled to a code object of its own.
+
+        Args:
+            node (ast.AST): function or class definition to visit.
+            visit_node (function): method visiting the definition.
+        """
+        # The code of a decorated definition starts at its first decorator
+        old_code_first_line, self.code_first_line = \
+            self.code_first_line, min([node.lineno] +
+                                      [decorator.lineno for decorator
+                                       in node.decorator_list])
+
+        try:
+            return visit_node(node)
+
+        finally:
+            self.code_first_line = old_code_first_line
 
     @property
     def ast_try_except(self):
         return ast.Try if IS_PYTHON_3 else ast.TryExcept
 
-    def wrap_with_try(self, node):
-        """Wrap an ast node in a 'try' node to enter debug on exception."""
+    def create_handlers(self, debug_args=()):
+        """Create the 'except' nodes that enter debug on exception.
+
+        Args:
+            debug_args (list): ast nodes of arguments to pass to
+                `start_debugging`.
+
+        Returns:
+            list. the exception handler nodes.
+        """
         handlers = []
 
         if self.ignore_exceptions is None:
@@ -156,29 +730,44 @@ class ErrorsCatchTransformer(ast.NodeTransformer):
                     (get_node_value(ast_node)
                      for ast_node in self.ignore_exceptions):
 
+                # Let the exception propagate where debugging is disabled
                 call_extra_parameters = [] if IS_PYTHON_3 else [None, None]
-                start_debug_cmd = ast.Expr(
-                    value=ast.Call(ast.Name("start_debugging", ast.Load()),
-                                   [], [], *call_extra_parameters))
+                start_debug_call = ast.Call(
+                    get_ipdbugger_node("start_debugging"), list(debug_args),
+                    [], *call_extra_parameters)
+                debug_if_enabled_cmd = ast.If(test=start_debug_call,
+                                              body=[ast.Raise()],
+                                              orelse=[])
 
                 catch_exception_type = None
                 if self.catch_exception is not None:
                     catch_exception_type = self.catch_exception
 
-                handlers.append(ast.ExceptHandler(type=catch_exception_type,
-                                                  name=None,
-                                                  body=[start_debug_cmd]))
+                handlers.append(ast.ExceptHandler(
+                    type=catch_exception_type,
+                    name=None,
+                    body=[debug_if_enabled_cmd]))
+
+        return handlers
+
+    def wrap_with_try(self, node):
+        """Wrap an ast node in a 'try' node to enter debug on exception."""
+        self.injected_tries += 1
 
         try_except_extra_params = {"finalbody": []} if IS_PYTHON_3 else {}
 
         new_node = self.ast_try_except(orelse=[], body=[node],
-                                       handlers=handlers,
+                                       handlers=self.create_handlers(),
                                        **try_except_extra_params)
 
         return ast.copy_location(new_node, node)
 
-    def try_except_handler(self, node):
-        """Handler for try except statement to ignore excepted exceptions."""
+    def get_try_ignore_exceptions(self, node):
+        """Return the ignore list for the body of a try statement.
+
+        Exceptions the statement excepts are ignored in its body, to let its
+        own handlers catch them.
+        """
         # List all excepted exception's names
         excepted_types = []
         for handler in node.handlers:
@@ -193,25 +782,133 @@ class ErrorsCatchTransformer(ast.NodeTransformer):
             else:
                 excepted_types.append(handler.type)
 
-        new_exception_list = self.ignore_exceptions
+        if self.ignore_exceptions is None:
+            return None
 
-        if self.ignore_exceptions is not None:
-            if excepted_types is None:
-                new_exception_list = None
-            else:
-                new_exception_list = list(set(excepted_types +
-                                              self.ignore_exceptions))
+        if excepted_types is None:
+            return None
+
+        return list(set(excepted_types + self.ignore_exceptions))
+
+    def try_except_handler(self, node):
+        """Handler for try except statement to ignore excepted exceptions."""
+        merge_handlers = self.can_merge_handlers(node)
 
         # Set the new ignore list, and save the old one
         old_exception_handlers, self.ignore_exceptions = \
-            self.ignore_exceptions, new_exception_list
+            self.ignore_exceptions, self.get_try_ignore_exceptions(node)
 
         # Run recursively on all sub nodes with the new ignore list
-        node.body = [self.visit(node_item) for node_item in node.body]
+        if merge_handlers:
+            node.body = [self.visit_unwrapped(node_item)
+                         for node_item in node.body]
+
+        else:
+            node.body = [self.visit(node_item) for node_item in node.body]
 
         # Revert changes from ignore list
         self.ignore_exceptions = old_exception_handlers
 
+        if merge_handlers:
+            self.merge_handlers(node)
+
+    def can_merge_handlers(self, node):
+        """Return whether to debug the try's body by handlers added to it.
+
+        The try's own handlers then catch the exceptions they except before
+        any other handler sees them, as in the original code. Resuming from
+        the handlers into the body requires Python 3.11+, and handlers can't
+        be added after a bare 'except' or to 'except*' clauses.
+        """
+        return CAN_RESUME_INTO_TRY and isinstance(node, ast.Try) and \
+            all(handler.type is not None for handler in node.handlers)
+
+    def merge_handlers(self, node):
+        """Add handlers that enter debug to a try statement's own handlers.
+
+        Args:
+            node (ast.Try): try statement whose body was visited.
+        """
+        if self.ignore_exceptions is None:
+            return
+
+        resume_table = []
+        next_line = node.orelse[0].lineno if node.orelse else None
+        self.add_resume_entries(node.body, next_line, resume_table)
+
+        node.handlers.extend(self.create_handlers(
+            [ast.Constant(tuple(resume_table))]))
+
+    def visit_unwrapped(self, node):
+        """Visit a statement debugged by the handlers of an enclosing try.
+
+        Conditions and 'while' loops hold no state of their own, so their
+        statements are debugged by the same handlers.
+
+        Args:
+            node (ast.AST): statement to visit.
+        """
+        if isinstance(node, self.ast_try_except):
+            self.try_except_handler(node)
+            return node
+
+        if isinstance(node, (ast.If, ast.While)):
+            node.test = self.visit(node.test)
+            node.body = [self.visit_unwrapped(node_item)
+                         for node_item in node.body]
+            node.orelse = [self.visit_unwrapped(node_item)
+                           for node_item in node.orelse]
+            return node
+
+        if isinstance(node, self.CODE_STATEMENTS):
+            return self.visit_code(
+                node, super(ErrorsCatchTransformer, self).generic_visit)
+
+        # Run recursively on all sub nodes
+        return super(ErrorsCatchTransformer, self).generic_visit(node)
+
+    def add_resume_entries(self, statements, next_line, resume_table):
+        """Add the lines to resume at after each of the statements fails.
+
+        Each entry of the table is the first and last lines of a statement,
+        and the line to resume at, or None to continue past the block. The
+        lines are relative to the first line of the code holding the block.
+
+        Args:
+            statements (list): statements following each other.
+            next_line (number): line to resume at after the last statement.
+            resume_table (list): table to add the entries to.
+        """
+        def add_entry(first_line, last_line, resume_line):
+            if resume_line is not None:
+                resume_line -= self.code_first_line
+
+            resume_table.append((first_line - self.code_first_line,
+                                 last_line - self.code_first_line,
+                                 resume_line))
+
+        for index, statement in enumerate(statements):
+            following_line = next_line
+            if index + 1 < len(statements):
+                following_line = statements[index + 1].lineno
+
+            if isinstance(statement, (ast.If, ast.While)):
+                add_entry(statement.lineno, statement.test.end_lineno,
+                          following_line)
+
+                # A loop's body goes back to testing its condition
+                body_next_line = statement.lineno \
+                    if isinstance(statement, ast.While) else following_line
+
+                self.add_resume_entries(statement.body, body_next_line,
+                                        resume_table)
+                self.add_resume_entries(statement.orelse, following_line,
+                                        resume_table)
+
+            else:
+                add_entry(statement.lineno, statement.end_lineno,
+                          following_line)
+
     # pylint: disable=invalid-name
     def visit_Call(self, node):
         """Propagate 'debug' wrapper into inner function calls if needed.
@@ -223,18 +920,17 @@ class ErrorsCatchTransformer(ast.NodeTransformer):
             return node
 
         if self.ignore_exceptions is None:
-            ignore_exceptions = ast.Name("None", ast.Load())
+            ignore_exceptions = get_none_node()
 
         else:
             ignore_exceptions = ast.List(self.ignore_exceptions, ast.Load())
 
-        catch_exception_type = self.catch_exception \
-            if self.catch_exception else "None"
+        catch_exception = self.catch_exception \
+            if self.catch_exception else get_none_node()
 
-        catch_exception = ast.Name(catch_exception_type, ast.Load())
         depth = ast.Num(self.depth - 1 if self.depth > 0 else -1)
 
-        debug_node_name = ast.Name("debug", ast.Load())
+        debug_node_name = get_ipdbugger_node("debug")
         call_extra_parameters = [] if IS_PYTHON_3 else [None, None]
         node.func = ast.Call(debug_node_name,
                              [node.func, ignore_exceptions,
@@ -271,6 +967,87 @@ class ErrorsCatchTransformer(ast.NodeTransformer):
         return super(ErrorsCatchTransformer, self).generic_visit(node)
 
 
+class CompactErrorsCatchTransformer(ErrorsCatchTransformer):
+    """Surround each block of statements with a single try/except block.
+
+    Instead of a handler for each statement, the handler of a block gets a
+    table of the lines of its statements, to resume at the statement after
+    the failing one. Only bodies of loops and 'with' statements need blocks
+    of their own, since their state can't be entered from outside of them.
+    """
+
+    # Statements whose bodies are separate blocks
+    BLOCK_STATEMENTS = tuple(getattr(ast, name) for name in
+                             ("FunctionDef", "AsyncFunctionDef", "ClassDef",
+                              "For", "AsyncFor", "With", "AsyncWith",
+                              "match_case")
+                             if hasattr(ast, name))
+
+    TRY_STATEMENTS = tuple(getattr(ast, name) for name in ("Try", "TryStar")
+                           if hasattr(ast, name))
+
+    def wrap_block(self, statements):
+        """Wrap a block's statements in a single 'try' node.
+
+        Args:
+            statements (list): visited statements of the block.
+
+        Returns:
+            list. the block's new statements.
+        """
+        self.injected_tries += 1
+        resume_table = []
+        self.add_resume_entries(statements, None, resume_table)
+
+        new_node = ast.Try(body=statements,
+                           handlers=self.create_handlers(
+                               [ast.Constant(tuple(resume_table))]),
+                           orelse=[], finalbody=[])
+
+        return [ast.copy_location(new_node, statements[0])]
+
+    def generic_visit(self, node):
+        """Wrap the blocks of the node's statements with try/except blocks.
+
+        Args:
+            node (ast.AST): node to visit.
+        """
+        if isinstance(node, self.TRY_STATEMENTS):
+            if self.can_merge_handlers(node):
+                self.try_except_handler(node)
+                return node
+
+            old_exception_handlers, self.ignore_exceptions = \
+                self.ignore_exceptions, self.get_try_ignore_exceptions(node)
+
+            node.body = self.wrap_block([self.visit(node_item)
+                                         for node_item in node.body])
+
+            self.ignore_exceptions = old_exception_handlers
+            return node
+
+        # Run recursively on all sub nodes
+        node = super(ErrorsCatchTransformer, self).generic_visit(node)
+
+        if isinstance(node, self.BLOCK_STATEMENTS):
+            node.body = self.wrap_block(node.body)
+
+        return node
+
+    def visit_unwrapped(self, node):
+        """Visit a statement, compact blocks never wrap single statements."""
+        return self.visit(node)
+
+    # pylint: disable=invalid-name
+    def visit_Call(self, node):
+        """Propagate the compact 'debug' wrapper into inner function calls."""
+        node = super(CompactErrorsCatchTransformer, self).visit_Call(node)
+        if self.depth != 0:
+            node.func.args.append(ast.Constant(True))
+
+        return node
+
+
 def get_last_lineno(node):
     """Recursively find the last line number of the ast node."""
     max_lineno = 0
@@ -290,8 +1067,170 @@ def get_last_lineno(node):
     return max_lineno
 
 
+def instrument_source(source, start_num, filename, free_vars,
+                      ignore_exceptions, catch_exception, depth,
+                      compact=False):
+    """Compile a function's source with a try/except around each statement.
+
+    Args:
+        source (str): dedented source code of the function.
+        start_num (number): line number the function starts at.
+        filename (str): file name of the function's code.
+        free_vars (tuple): names of the function's closure variables.
+        ignore_exceptions (list): list of classes of exceptions not to catch.
+        catch_exception (type): class of exception to catch and debug.
+        depth (number): how many levels of inner function calls to propagate.
+        compact (bool): whether to surround blocks of statements instead of
+            each statement, if the interpreter can resume into them.
+
+    Returns:
+        tuple. the instrumented code object and the number of try blocks
+            injected into it.
+    """
+    transformer_class = ErrorsCatchTransformer
+    if compact and CAN_RESUME_INTO_TRY:
+        transformer_class = CompactErrorsCatchTransformer
+
+    transformer = transformer_class(
+        ignore_exceptions=ignore_exceptions,
+        catch_exception=catch_exception,
+        depth=depth)
+
+    old_code_tree = ast.parse(source)
+    # Reposition the line numbers to their original value
+    ast.increment_lineno(old_code_tree, start_num - 1)
+
+    # Delete the debugger decorator of the function
+    del old_code_tree.body[0].decorator_list[:]
+
+    tree = transformer.visit(old_code_tree)
+
+    # Add pass at the end (to enable debugging the last command)
+    pass_cmd = ast.Pass()
+    func_body = tree.body[0].body
+    pass_cmd.lineno = get_last_lineno(func_body[-1]) + 1
+    pass_cmd.end_lineno = pass_cmd.lineno
+    pass_cmd.col_offset = func_body[-1].col_offset
+    func_body.append(pass_cmd)
+
+    # Fix missing line numbers and column offsets before compiling
+    for node in ast.walk(tree):
+        if not hasattr(node, 'lineno'):
+            # Injected nodes must not take the end line of their parents,
+            # e.g. method calls are located by their attribute's end line
+            node.lineno = node.end_lineno = 0
+
+    ast.fix_missing_locations(tree)
+
+    code = compile_function_tree(tree, filename, free_vars)
+    return code, transformer.injected_tries
+
+
+def compile_function_tree(tree, filename, free_vars):
+    """Compile the function defined in a module's tree to a code object.
+
+    Args:
+        tree (ast.Module): parsed module with the function as its only
+            statement.
+        filename (str): file name of the function's code.
+        free_vars (tuple): names of the function's closure variables, so the
+            code object can be used with the function's closure.
+
+    Returns:
+        types.CodeType. code object of the function.
+    """
+    # Define the wrapping function object
+    function_definition = "def _free_vars_wrapper(): pass"
+    wrapping_function = ast.parse(function_definition).body[0]
+
+    # Initialize closure's variables to None
+    body_list = [ast.parse("{var} = None".format(var=free_var)).body[0]
+                 for free_var in free_vars]
+
+    # Add the original function ("victim") to the wrapping function
+    body_list.append(tree.body[0])
+
+    wrapping_function.body = body_list
+
+    # Replace original function ("victim") with the wrapping function
+    tree.body[0] = wrapping_function
+
+    # Create a new runnable code object to replace the original code
+    code = compile(tree, filename, 'exec')
+    return code.co_consts[0].co_consts[1]
+
+
+def get_instrumented_code(source, start_num, filename, free_vars,
+                          ignore_exceptions, catch_exception, depth,
+                          compact=False):
+    """Instrument a function's source, reusing cached transforms if possible.
+
+    The arguments are the ones of `instrument_source`.
+
+    Returns:
+        tuple. the instrumented code object and the number of try blocks
+            injected into it.
+    """
+    instrument_args = (source, start_num, filename, free_vars,
+                       ignore_exceptions, catch_exception, depth, compact)
+
+    transform_cache = cache.TRANSFORM_CACHE
+    if transform_cache is None:
+        return instrument_source(*instrument_args)
+
+    cache_key = get_transform_key(*instrument_args)
+    instrumented = transform_cache.get(cache_key)
+    if instrumented is None:
+        instrumented = instrument_source(*instrument_args)
+        transform_cache.set(cache_key, instrumented)
+
+    return instrumented
+
+
+def set_instrumented_code(victim, code, original_code, injected_tries,
+                          ignore_exceptions, catch_exception, depth,
+                          compact=False):
+    """Replace a function's code with its instrumented code, in place.
+
+    Args:
+        victim (function): function to patch.
+        code (types.CodeType): instrumented code of the function.
+        original_code (types.CodeType): code of the function's source as is.
+        injected_tries (number): how many try blocks were injected to code.
+        ignore_exceptions (list): list of classes of exceptions not to catch.
+        catch_exception (type): class of exception to catch and debug.
+        depth (number): how many levels of inner function calls to propagate.
+        compact (bool): whether the code surrounds blocks of statements.
+    """
+    # Don't expose the wrapping function in the qualified name
+    if hasattr(code, "co_qualname"):
+        code = code.replace(co_qualname=original_code.co_qualname)
+
+    victim._ipdebug_original_code = original_code
+    victim.__code__ = code
+
+    # Set a flag to indicate that the method was wrapped, keeping the code
+    # to tell if it was replaced since (e.g. by reloading the function)
+    victim._ipdebug_wrapped = True
+    victim._ipdebug_code = code
+
+    # Keep the instrumentation details for overhead introspection and for
+    # re-instrumenting the function when its source changes
+    victim._ipdebug_injected_tries = injected_tries
+    victim._ipdebug_ignore_exceptions = ignore_exceptions
+    victim._ipdebug_catch_exception = catch_exception
+    victim._ipdebug_depth = depth
+    victim._ipdebug_compact = compact
+
+
+def dedent_source_lines(sourcelines):
+    """Join the source lines of a function, dedented to its def statement."""
+    indent = re.match(r'\s*', sourcelines[0]).group()
+    return ''.join(l.replace(indent, '', 1) for l in sourcelines)
+
+
 def debug(victim=None, ignore_exceptions=(BdbQuit,),
-          catch_exception=None, depth=0):
+          catch_exception=None, depth=0, compact=False):
     """A decorator function to catch exceptions and enter debug mode.
 
     Args:
@@ -301,6 +1240,10 @@ def debug(victim=None, ignore_exceptions=(BdbQuit,),
         catch_exception (type): class of exception to catch and debug.
             default is None, meaning catch all exceptions.
         depth (number): how many levels of inner function calls to propagate.
+        compact (bool): whether to surround each block of statements with a
+            single try-except, instead of each statement, making the code
+            about a third of the size. Requires Python 3.11 or later, older
+            interpreters fall back to surrounding each statement.
 
     Returns:
         object. wrapped class or function.
@@ -313,26 +1256,20 @@ def debug(victim=None, ignore_exceptions=(BdbQuit,),
         # get the real victim
         def wrapper(real_victim):
             return debug(real_victim, ignore_exceptions,
-                         catch_exception, depth)
+                         catch_exception, depth, compact)
 
         return wrapper
 
     register_break_signal()
     if inspect.isfunction(victim):
-        if hasattr(victim, '_ipdebug_wrapped'):
+        if is_instrumented(victim):
             # Don't wrap the function more than once
             return victim
 
-        _transformer = ErrorsCatchTransformer(
-            ignore_exceptions=ignore_exceptions,
-            catch_exception=catch_exception,
-            depth=depth)
-
         try:
             # Try to get the source code of the wrapped object.
             sourcelines, start_num = inspect.getsourcelines(victim.__code__)
-            indent = re.match(r'\s*', sourcelines[0]).group()
-            source = ''.join(l.replace(indent, '', 1) for l in sourcelines)
+            source = dedent_source_lines(sourcelines)
 
         except IOError:
             # Worst-case scenario we can only catch errors at a granularity
@@ -342,79 +1279,20 @@ def debug(victim=None, ignore_exceptions=(BdbQuit,),
         else:
             # If we have access to the source, we can silence errors on a
             # per-expression basis, which is "better"
+            code, injected_tries = get_instrumented_code(
+                source, start_num, victim.__code__.co_filename,
+                victim.__code__.co_freevars,
+                ignore_exceptions, catch_exception, depth, compact)
 
-            old_code_tree = ast.parse(source)
-            # Reposition the line numbers to their original value
-            ast.increment_lineno(old_code_tree, start_num - 1)
-            tree = _transformer.visit(old_code_tree)
-
-            import_debug_cmd = ast.ImportFrom(
-                __name__, [ast.alias("start_debugging", None),
-                           ast.alias("debug", None)], 0)
-
-            # Add import to the debugger as first command
-            tree.body[0].body.insert(0, import_debug_cmd)
-
-            # Add import to the exception classes
-            if catch_exception is not None:
-                import_exception_cmd = ast.ImportFrom(
-                    catch_exception.__module__,
-                    [ast.alias(catch_exception.__name__, None)], 0)
-
-                tree.body[0].body.insert(1, import_exception_cmd)
-
-            if ignore_exceptions is not None:
-                for exception_class in ignore_exceptions:
-                    import_exception_cmd = ast.ImportFrom(
-                        exception_class.__module__,
-                        [ast.alias(exception_class.__name__, None)], 0)
-
-                    tree.body[0].body.insert(1, import_exception_cmd)
-
-            # Delete the debugger decorator of the function
-            del tree.body[0].decorator_list[:]
-
-            # Add pass at the end (to enable debugging the last command)
-            pass_cmd = ast.Pass()
-            func_body = tree.body[0].body
-            pass_cmd.lineno = get_last_lineno(func_body[-1]) + 1
-            pass_cmd.col_offset = func_body[-1].col_offset
-            func_body.append(pass_cmd)
-
-            # Fix missing line numbers and column offsets before compiling
-            for node in ast.walk(tree):
-                if not hasattr(node, 'lineno'):
-                    node.lineno = 0
-
-            ast.fix_missing_locations(tree)
-
-            # Define the wrapping function object
-            function_definition = "def _free_vars_wrapper(): pass"
-            wrapping_function = ast.parse(function_definition).body[0]
-
-            # Initialize closure's variables to None
-            body_list = [ast.parse("{var} = None".format(var=free_var)).body[0]
-                         for free_var in victim.__code__.co_freevars]
-
-            # Add the original function ("victim") to the wrapping function
-            body_list.append(tree.body[0])
-
-            wrapping_function.body = body_list
-
-            # Replace original function ("victim") with the wrapping function
-            tree.body[0] = wrapping_function
-
-            # Create a new runnable code object to replace the original code
-            code = compile(tree, victim.__code__.co_filename, 'exec')
-            victim.__code__ = code.co_consts[0].co_consts[1]
-
-            # Set a flag to indicate that the method was wrapped
-            victim._ipdebug_wrapped = True
+            set_instrumented_code(victim, code, victim.__code__,
+                                  injected_tries, ignore_exceptions,
+                                  catch_exception, depth, compact)
 
             return victim
 
     elif inspect.ismethod(victim):
-        debug(victim.__func__, ignore_exceptions, catch_exception)
+        debug(victim.__func__, ignore_exceptions, catch_exception,
+              compact=compact)
         return victim
 
     elif isinstance(victim, type):
@@ -423,7 +1301,8 @@ def debug(victim=None, ignore_exceptions=(BdbQuit,),
             if isinstance(member, (type, types.FunctionType,
                                    types.LambdaType, types.MethodType)):
                 setattr(victim, name,
-                        debug(member, ignore_exceptions, catch_exception))
+                        debug(member, ignore_exceptions, catch_exception,
+                              compact=compact))
 
         return victim
 
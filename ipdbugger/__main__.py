@@ -0,0 +1,31 @@
+"""Command line interface of ipdbugger.
+
+Usage:
+    python -m ipdbugger replay <failure id> [--store <directory>]
+"""
+from __future__ import absolute_import
+
+import argparse
+
+from .replay import DEFAULT_STORE_DIRECTORY, FailureStore, replay_failure
+
+
+def main(argv=None):
+    """Parse the command line arguments and run the requested command."""
+    parser = argparse.ArgumentParser(prog="python -m ipdbugger",
+                                     description="ipdb-based debugger")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    replay_parser = subparsers.add_parser(
+        "replay", help="re-run a captured failure in a debugging session")
+    replay_parser.add_argument("failure_id", help="id of the failure")
+    replay_parser.add_argument("--store", default=DEFAULT_STORE_DIRECTORY,
+                               help="directory of the captured failures")
+
+    args = parser.parse_args(argv)
+    replay_failure(args.failure_id, FailureStore(args.store))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Cache of the code objects instrumented by `debug`.
+
+Parsing, transforming and compiling the source of each debugged function is
+the costly part of `debug`. When a cache is set, the instrumented code is
+kept by a hash of the source and the instrumentation options, in memory and
+optionally in a directory that several processes can share.
+"""
+# pylint: disable=global-statement
+import os
+import sys
+import marshal
+import hashlib
+import tempfile
+
+
+TRANSFORM_CACHE = None
+
+CACHE_EXTENSION = ".code"
+
+# The transformers are defined in the package's main module
+TRANSFORMER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "__init__.py")
+TRANSFORMER_HASH = None
+
+
+def get_exception_name(exception_class):
+    """Return the full name of an exception class, for hashing."""
+    return "{}.{}".format(exception_class.__module__, exception_class.__name__)
+
+
+def get_transformer_hash():
+    """Return a hash of the transformers' source, computed once.
+
+    Cached code objects outlive the process, so a new version of ipdbugger
+    must not be served the transforms of an older one.
+    """
+    global TRANSFORMER_HASH
+    if TRANSFORMER_HASH is None:
+        try:
+            with open(TRANSFORMER_PATH, "rb") as transformer_file:
+                TRANSFORMER_HASH = hashlib.sha1(
+                    transformer_file.read()).hexdigest()
+
+        except (IOError, OSError):
+            # E.g. installed without sources, identify it by its location
+            TRANSFORMER_HASH = TRANSFORMER_PATH
+
+    return TRANSFORMER_HASH
+
+
+def get_transform_key(source, start_num, filename, free_vars,
+                      ignore_exceptions, catch_exception, depth,
+                      compact=False):
+    """Return a key identifying the instrumentation of a function's source.
+
+    The arguments are the ones of `instrument_source`.
+    """
+    if ignore_exceptions is not None:
+        ignore_exceptions = [get_exception_name(exception_class)
+                             for exception_class in ignore_exceptions]
+
+    if catch_exception is not None:
+        catch_exception = get_exception_name(catch_exception)
+
+    # Code objects can only be shared between identical interpreters
+    key_data = repr((sys.version, get_transformer_hash(), source, start_num,
+                     filename, tuple(free_vars), ignore_exceptions,
+                     catch_exception, depth, compact))
+
+    return hashlib.sha1(key_data.encode("utf-8")).hexdigest()
+
+
+class TransformCache(object):
+    """Cache of instrumented code objects.
+
+    Attributes:
+        directory (str): path of the directory to share the cache in, or None
+            to keep it only in memory.
+        entries (dict): instrumented code objects and their number of
+            injected try blocks, by their transform key.
+        hits (number): how many lookups found a cached transform.
+        misses (number): how many lookups required a new transform.
+    """
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_path(self, key):
+        """Return the path of the cache entry's file."""
+        return os.path.join(self.directory, key + CACHE_EXTENSION)
+
+    def load(self, key):
+        """Load a cache entry from the cache directory, None if missing."""
+        try:
+            with open(self.get_path(key), "rb") as entry_file:
+                return marshal.load(entry_file)
+
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            return None
+
+    def get(self, key):
+        """Return the cached transform of the key, None if missing."""
+        entry = self.entries.get(key)
+        if entry is None and self.directory is not None:
+            entry = self.load(key)
+            if entry is not None:
+                self.entries[key] = entry
+
+        if entry is None:
+            self.misses += 1
+
+        else:
+            self.hits += 1
+
+        return entry
+
+    def set(self, key, entry):
+        """Cache the transform of the key.
+
+        Args:
+            key (str): transform key of the function.
+            entry (tuple): instrumented code object and the number of try
+                blocks injected into it.
+        """
+        self.entries[key] = entry
+        if self.directory is None:
+            return
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        # Write to a temporary file first, other processes may read the entry
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(file_descriptor, "wb") as entry_file:
+            marshal.dump(entry, entry_file)
+
+        getattr(os, "replace", os.rename)(temp_path, self.get_path(key))
+
+
+def set_transform_cache(transform_cache):
+    """Set the cache `debug` uses, None to stop caching transforms.
+
+    Args:
+        transform_cache (TransformCache): cache to use.
+    """
+    global TRANSFORM_CACHE
+    TRANSFORM_CACHE = transform_cache
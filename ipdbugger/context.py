@@ -0,0 +1,89 @@
+"""Per-context enablement of the debugging of instrumented code.
+
+By default, the handlers `debug` adds start debugging in every thread and
+every context. On a busy server you can disable them by default, and enable
+them only for the flow you want to debug:
+
+    set_enabled_by_default(False)
+
+    with enabled():
+        handle_request()
+
+Outside the enabled scopes, exceptions propagate as in undecorated code.
+"""
+# pylint: disable=global-statement
+import threading
+from contextlib import contextmanager
+
+try:
+    from contextvars import ContextVar
+
+except ImportError:
+    ContextVar = None
+
+
+ENABLED_BY_DEFAULT = True
+
+if ContextVar is not None:
+    ENABLED_STATE = ContextVar("ipdbugger_enabled", default=None)
+
+else:
+    # Interpreters without contextvars get a per-thread enablement
+    ENABLED_STATE = threading.local()
+
+
+def get_enabled_state():
+    """Return the enablement of the current context, None if not set."""
+    if ContextVar is not None:
+        return ENABLED_STATE.get()
+
+    return getattr(ENABLED_STATE, "enabled", None)
+
+
+def set_enabled_state(state):
+    """Set the enablement of the current context, None to unset it."""
+    if ContextVar is not None:
+        ENABLED_STATE.set(state)
+
+    else:
+        ENABLED_STATE.enabled = state
+
+
+def debugging_enabled():
+    """Return whether caught exceptions should be debugged in this context."""
+    state = get_enabled_state()
+    if state is None:
+        return ENABLED_BY_DEFAULT
+
+    return state
+
+
+def set_enabled_by_default(enable):
+    """Set whether debugging is enabled outside `enabled`/`disabled` scopes.
+
+    Args:
+        enable (bool): whether to debug caught exceptions by default.
+    """
+    global ENABLED_BY_DEFAULT
+    ENABLED_BY_DEFAULT = enable
+
+
+@contextmanager
+def enabled(enable=True):
+    """Enable debugging of instrumented code in the current context.
+
+    Args:
+        enable (bool): whether to enable or disable debugging in the scope.
+    """
+    old_state = get_enabled_state()
+    set_enabled_state(enable)
+    try:
+        yield
+
+    finally:
+        set_enabled_state(old_state)
+
+
+def disabled():
+    """Disable debugging of instrumented code in the current context."""
+    return enabled(False)
@@ -0,0 +1,173 @@
+"""Introspection of the overhead added by the `debug` instrumentation."""
+# pylint: disable=protected-access
+import types
+import inspect
+import timeit
+from collections import namedtuple
+
+
+InstrumentationOverhead = namedtuple("InstrumentationOverhead", [
+    "original_size",
+    "instrumented_size",
+    "injected_tries",
+    "original_exception_table_size",
+    "instrumented_exception_table_size",
+    "original_line_table_size",
+    "instrumented_line_table_size",
+    "depth_active",
+    "call_ratio"])
+
+
+def get_table_size(code, *attributes):
+    """Return the size of the first table of the code object that exists.
+
+    Args:
+        code (types.CodeType): code object to inspect.
+        attributes (list): names of the table attributes, by preference.
+
+    Returns:
+        number. size of the table in bytes, 0 if the code has no such table.
+    """
+    for attribute in attributes:
+        table = getattr(code, attribute, None)
+        if table is not None:
+            return len(table)
+
+    return 0
+
+
+def get_original_function(function):
+    """Return a function object that runs the original, uninstrumented code.
+
+    Args:
+        function (function): instrumented function.
+
+    Returns:
+        function. copy of the function with its original code object.
+    """
+    original = types.FunctionType(function._ipdebug_original_code,
+                                  function.__globals__,
+                                  function.__name__,
+                                  function.__defaults__,
+                                  function.__closure__)
+
+    if hasattr(function, "__kwdefaults__"):
+        original.__kwdefaults__ = function.__kwdefaults__
+
+    return original
+
+
+def measure_call_ratio(function, args, kwargs, number):
+    """Measure the call time of an instrumented function against the original.
+
+    Args:
+        function (function): instrumented function.
+        args (tuple): positional arguments to call the function with.
+        kwargs (dict): keyword arguments to call the function with.
+        number (number): how many calls to time in each repetition.
+
+    Returns:
+        float. ratio between the instrumented and the original call times.
+    """
+    original = get_original_function(function)
+
+    def call_instrumented():
+        function(*args, **kwargs)
+
+    def call_original():
+        original(*args, **kwargs)
+
+    instrumented_time = min(timeit.repeat(call_instrumented,
+                                          number=number, repeat=3))
+    original_time = min(timeit.repeat(call_original,
+                                      number=number, repeat=3))
+
+    return instrumented_time / max(original_time, 1e-9)
+
+
+def function_overhead(function, args=None, kwargs=None, number=1000):
+    """Return the instrumentation overhead of a single function."""
+    original_code = function._ipdebug_original_code
+    instrumented_code = function.__code__
+
+    call_ratio = None
+    if args is not None or kwargs is not None:
+        call_ratio = measure_call_ratio(function, args or (), kwargs or {},
+                                        number)
+
+    return InstrumentationOverhead(
+        original_size=len(original_code.co_code),
+        instrumented_size=len(instrumented_code.co_code),
+        injected_tries=function._ipdebug_injected_tries,
+        original_exception_table_size=get_table_size(
+            original_code, "co_exceptiontable"),
+        instrumented_exception_table_size=get_table_size(
+            instrumented_code, "co_exceptiontable"),
+        original_line_table_size=get_table_size(
+            original_code, "co_linetable", "co_lnotab"),
+        instrumented_line_table_size=get_table_size(
+            instrumented_code, "co_linetable", "co_lnotab"),
+        depth_active=function._ipdebug_depth != 0,
+        call_ratio=call_ratio)
+
+
+def is_instrumented(member):
+    """Return whether the object is a function running code `debug` made.
+
+    A function that was wrapped but whose code was replaced since, e.g. by
+    reloading it, is no longer instrumented.
+    """
+    return inspect.isfunction(member) and \
+        getattr(member, "_ipdebug_code", None) is member.__code__
+
+
+def overhead(target, args=None, kwargs=None, number=1000):
+    """Report the overhead `debug` added to functions.
+
+    Args:
+        target (typing.Union(module, type, function)): instrumented function,
+            or a class or module containing instrumented functions.
+        args (tuple): positional arguments for a call microbenchmark of a
+            function target. The benchmark only runs if arguments are given,
+            and they shouldn't make the function raise.
+        kwargs (dict): keyword arguments for the call microbenchmark.
+        number (number): how many calls to time in each benchmark repetition.
+
+    Returns:
+        InstrumentationOverhead. overhead report of a function target, or a
+        dict of the reports of the instrumented members of a class or module
+        by their names.
+    """
+    if inspect.ismethod(target):
+        target = target.__func__
+
+    if inspect.isfunction(target):
+        if not is_instrumented(target):
+            raise ValueError(
+                "Function {!r} is not instrumented".format(target.__name__))
+
+        return function_overhead(target, args, kwargs, number)
+
+    if isinstance(target, type):
+        return {name: function_overhead(member)
+                for name, member in vars(target).items()
+                if is_instrumented(member)}
+
+    if inspect.ismodule(target):
+        reports = {}
+        for name, member in vars(target).items():
+            if getattr(member, "__module__", None) != target.__name__:
+                continue
+
+            if is_instrumented(member):
+                reports[name] = function_overhead(member)
+
+            elif isinstance(member, type):
+                for method_name, method_report in overhead(member).items():
+                    reports["{}.{}".format(name, method_name)] = method_report
+
+        return reports
+
+    raise TypeError(
+        "Overhead can only be reported for functions, classes and modules. "
+        "Got object {!r} of type {}".format(target, type(target).__name__))
@@ -0,0 +1,105 @@
+"""pytest plugin for debugging failing statements of tests with ipdbugger.
+
+The plugin is registered by the `pytest_ipdbugger` entry point module.
+
+Run pytest with `--ipdbugger` (or `--ipdbugger=<depth>` to also debug inner
+calls) to instrument each test right before it runs. Instrumented code is
+cached by source, in pytest's cache directory, so it's shared between the
+runs and the xdist workers of the session.
+"""
+from __future__ import absolute_import
+
+import timeit
+import inspect
+
+import pytest
+
+import ipdbugger
+from .cache import TransformCache, set_transform_cache
+
+
+CACHE_DIRECTORY_NAME = "ipdbugger"
+
+
+class IpdbuggerPlugin(object):
+    """Instrument tests lazily, right before they run.
+
+    Attributes:
+        config (pytest.Config): the session's configuration.
+        depth (number): how many levels of inner calls to debug.
+        transform_cache (TransformCache): cache of instrumented code.
+        instrumented_count (number): how many tests were instrumented.
+        instrument_time (float): seconds spent on instrumenting tests.
+        capture_suspended (bool): whether a session suspended the capturing
+            of the current test's output.
+    """
+    def __init__(self, config):
+        self.config = config
+        self.depth = config.getoption("ipdbugger_depth")
+
+        cache_directory = None
+        if getattr(config, "cache", None) is not None:
+            cache_directory = str(config.cache.makedir(CACHE_DIRECTORY_NAME))
+
+        self.transform_cache = TransformCache(cache_directory)
+        self.instrumented_count = 0
+        self.instrument_time = 0.0
+        self.capture_suspended = False
+
+        set_transform_cache(self.transform_cache)
+        ipdbugger.SESSION_START_CALLBACKS.append(self.suspend_capture)
+
+    def suspend_capture(self):
+        """Stop capturing the terminal, for the interactive session."""
+        capture_manager = self.config.pluginmanager.getplugin(
+            "capturemanager")
+
+        if capture_manager is not None and not self.capture_suspended:
+            capture_manager.suspend_global_capture(in_=True)
+            self.capture_suspended = True
+
+    def instrument(self, item):
+        """Apply `debug` on the test's function and class."""
+        function = getattr(item.obj, "__func__", item.obj)
+
+        # Instrument the test itself, not the wrappers of its decorators
+        if hasattr(inspect, "unwrap"):
+            function = inspect.unwrap(function)
+
+        start_time = timeit.default_timer()
+
+        ipdbugger.debug(function, depth=self.depth)
+        if item.cls is not None:
+            ipdbugger.debug(item.cls)
+
+        self.instrument_time += timeit.default_timer() - start_time
+        self.instrumented_count += 1
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self, item):
+        """Instrument the test before it runs."""
+        if isinstance(item, pytest.Function):
+            self.instrument(item)
+
+        try:
+            yield
+
+        finally:
+            if self.capture_suspended:
+                capture_manager = self.config.pluginmanager.getplugin(
+                    "capturemanager")
+                capture_manager.resume_global_capture()
+                self.capture_suspended = False
+
+    def pytest_terminal_summary(self, terminalreporter):
+        """Report the instrumentation overhead."""
+        terminalreporter.write_line(
+            "ipdbugger: instrumented {} tests in {:.3f}s "
+            "({} cached transforms, {} new)".format(
+                self.instrumented_count, self.instrument_time,
+                self.transform_cache.hits, self.transform_cache.misses))
+
+    def pytest_unconfigure(self):
+        """Stop caching transforms and suspending the capture."""
+        set_transform_cache(None)
+        ipdbugger.SESSION_START_CALLBACKS.remove(self.suspend_capture)
@@ -0,0 +1,363 @@
+"""Capture failures of instrumented functions and replay them offline.
+
+When failure capturing is enabled, a caught exception doesn't start an ipdb
+session. Instead, the call arguments of the failing function and the globals
+it uses are pickled to a bounded local store, and the flow immediately
+re-raises the exception (or continues). Later on, the failure can be replayed
+under `debug` with an interactive session:
+
+    $ python -m ipdbugger replay <failure id>
+"""
+from __future__ import print_function
+from __future__ import absolute_import
+# pylint: disable=global-statement
+import os
+import sys
+import uuid
+import runpy
+import types
+import pickle
+import inspect
+import traceback
+import importlib
+from collections import namedtuple
+
+from termcolor import colored
+
+
+# Replaying unpickles the failures, so they are kept in a per-user directory
+DEFAULT_STORE_DIRECTORY = os.path.join(
+    os.environ.get("XDG_CACHE_HOME",
+                   os.path.join(os.path.expanduser("~"), ".cache")),
+    "ipdbugger", "failures")
+STORE_DIRECTORY_MODE = 0o700
+DEFAULT_MAX_FAILURES = 100
+# The store is pruned once it holds this fraction more than its bound
+PRUNE_BATCH_RATIO = 10
+FAILURE_EXTENSION = ".pickle"
+
+FAILURE_STORE = None
+
+
+UnpicklableValue = namedtuple("UnpicklableValue", ["repr"])
+
+
+def safe_repr(value):
+    """Return the repr of a value, even if its __repr__ fails."""
+    try:
+        return repr(value)
+
+    except Exception:  # pylint: disable=broad-except
+        return object.__repr__(value)
+
+
+def dump_value(value):
+    """Pickle a value, falling back to its marked repr if not picklable."""
+    try:
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    except Exception:  # pylint: disable=broad-except
+        return pickle.dumps(UnpicklableValue(safe_repr(value)),
+                            pickle.HIGHEST_PROTOCOL)
+
+
+def get_function_qualname(frame):
+    """Return the qualified name of the function running in the frame."""
+    code = frame.f_code
+    qualname = getattr(code, "co_qualname", None)
+    if qualname is not None:
+        return qualname
+
+    # Older interpreters, look for a method of the first argument's class
+    if code.co_argcount:
+        first_argument = frame.f_locals.get(code.co_varnames[0])
+        owner = first_argument if isinstance(first_argument, type) \
+            else type(first_argument)
+
+        for klass in inspect.getmro(owner):
+            member = vars(klass).get(code.co_name)
+            function = getattr(member, "__func__", member)
+            if getattr(function, "__code__", None) is code:
+                return "{}.{}".format(getattr(klass, "__qualname__",
+                                              klass.__name__),
+                                      code.co_name)
+
+    return code.co_name
+
+
+def get_call_arguments(frame):
+    """Return the arguments of the function running in the frame.
+
+    Note:
+        The values are taken when the failure occurs, so arguments that were
+        reassigned or mutated by the function are captured as such, and
+        deleted arguments are captured as None.
+    """
+    code = frame.f_code
+    names = code.co_varnames
+    positional_count = code.co_argcount
+    keyword_only_count = getattr(code, "co_kwonlyargcount", 0)
+
+    local_variables = frame.f_locals
+    args = [local_variables.get(name) for name in names[:positional_count]]
+    kwargs = {name: local_variables.get(name)
+              for name in names[positional_count:
+                                positional_count + keyword_only_count]}
+
+    index = positional_count + keyword_only_count
+    if code.co_flags & inspect.CO_VARARGS:
+        args.extend(local_variables.get(names[index], ()))
+        index += 1
+
+    if code.co_flags & inspect.CO_VARKEYWORDS:
+        kwargs.update(local_variables.get(names[index], {}))
+
+    return args, kwargs
+
+
+def get_relevant_globals(frame):
+    """Return the global variables the frame's code uses.
+
+    Modules, functions and classes are skipped, since they are reloaded by
+    importing the function's module on replay.
+    """
+    return {name: frame.f_globals[name]
+            for name in frame.f_code.co_names
+            if name in frame.f_globals and
+            not isinstance(frame.f_globals[name],
+                           (types.ModuleType, types.FunctionType,
+                            types.BuiltinFunctionType, type))}
+
+
+class FailureStore(object):
+    """Bounded directory of captured failures.
+
+    Attributes:
+        directory (str): path of the directory to save the failures in.
+        max_failures (number): how many failures to keep, older ones are
+            deleted first. The store is pruned in batches, so it may hold up
+            to a tenth more failures.
+        reraise (bool): whether to re-raise captured exceptions, or to
+            continue the flow as if the failing statement passed.
+        failures_count (number): how many failures are in the store, as
+            counted by this process. None until the first capture.
+    """
+    def __init__(self, directory=DEFAULT_STORE_DIRECTORY,
+                 max_failures=DEFAULT_MAX_FAILURES, reraise=True):
+        self.directory = directory
+        self.max_failures = max_failures
+        self.reraise = reraise
+        self.failures_count = None
+
+    def check_directory(self):
+        """Check that only the current user can write to the store.
+
+        Raises:
+            ValueError: the directory belongs to another user, or others can
+                write to it, so its failures can't be trusted.
+        """
+        # Interpreters without user ids (e.g. on Windows) can't tell
+        if not hasattr(os, "getuid"):
+            return
+
+        directory_stat = os.stat(self.directory)
+        if directory_stat.st_uid != os.getuid():
+            raise ValueError("Failure store {} isn't owned by the current "
+                             "user".format(self.directory))
+
+        if directory_stat.st_mode & 0o022:
+            raise ValueError("Failure store {} is writable by other "
+                             "users".format(self.directory))
+
+    def get_path(self, failure_id):
+        """Return the path of the failure's file."""
+        return os.path.join(self.directory, failure_id + FAILURE_EXTENSION)
+
+    def capture(self, frame, exc_info):
+        """Save the failure of the function running in the frame.
+
+        Args:
+            frame (frame): frame of the failing instrumented function.
+            exc_info (tuple): info of the caught exception.
+
+        Returns:
+            str. id of the captured failure.
+        """
+        args, kwargs = get_call_arguments(frame)
+        record = {
+            "module": frame.f_globals.get("__name__"),
+            "qualname": get_function_qualname(frame),
+            "filename": frame.f_code.co_filename,
+            "args": [dump_value(value) for value in args],
+            "kwargs": {name: dump_value(value)
+                       for name, value in kwargs.items()},
+            "globals": {name: dump_value(value) for name, value
+                        in get_relevant_globals(frame).items()},
+            "traceback": "".join(traceback.format_exception(*exc_info))}
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory, STORE_DIRECTORY_MODE)
+
+        if self.failures_count is None:
+            self.check_directory()
+            self.failures_count = len(self.get_failure_paths())
+
+        failure_id = uuid.uuid4().hex[:12]
+        with open(self.get_path(failure_id), "wb") as failure_file:
+            pickle.dump(record, failure_file, pickle.HIGHEST_PROTOCOL)
+
+        self.failures_count += 1
+        if self.failures_count > \
+                self.max_failures + self.max_failures // PRUNE_BATCH_RATIO:
+            self.prune()
+
+        return failure_id
+
+    def get_failure_paths(self):
+        """Return the paths of the failures in the store."""
+        return [os.path.join(self.directory, file_name)
+                for file_name in os.listdir(self.directory)
+                if file_name.endswith(FAILURE_EXTENSION)]
+
+    def prune(self):
+        """Delete the oldest failures beyond the store's bound."""
+        paths = self.get_failure_paths()
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:max(len(paths) - self.max_failures, 0)]:
+            os.remove(path)
+
+        self.failures_count = min(len(paths), self.max_failures)
+
+    def load(self, failure_id):
+        """Return the record of a captured failure.
+
+        Raises:
+            KeyError: no failure with the given id is in the store.
+            ValueError: the store can't be trusted, see `check_directory`.
+        """
+        path = self.get_path(failure_id)
+        if not os.path.isfile(path):
+            raise KeyError("No captured failure {!r} in {}".format(
+                failure_id, self.directory))
+
+        self.check_directory()
+        with open(path, "rb") as failure_file:
+            return pickle.load(failure_file)
+
+
+def enable_failure_capture(directory=DEFAULT_STORE_DIRECTORY,
+                           max_failures=DEFAULT_MAX_FAILURES, reraise=True):
+    """Capture failures of instrumented functions instead of debugging them.
+
+    Args:
+        directory (str): path of the directory to save the failures in.
+        max_failures (number): how many failures to keep.
+        reraise (bool): whether to re-raise captured exceptions, or to
+            continue the flow as if the failing statement passed.
+
+    Returns:
+        FailureStore. store the failures are saved in.
+    """
+    global FAILURE_STORE
+    FAILURE_STORE = FailureStore(directory, max_failures, reraise)
+    return FAILURE_STORE
+
+
+def disable_failure_capture():
+    """Go back to starting an ipdb session on caught exceptions."""
+    global FAILURE_STORE
+    FAILURE_STORE = None
+
+
+def capture_failure(frame, exc_info):
+    """Capture the failure in the frame, and print its replay command.
+
+    Capturing runs in the failing flow, so its own errors are only printed,
+    to let the flow go on with the original exception.
+    """
+    try:
+        failure_id = FAILURE_STORE.capture(frame, exc_info)
+
+    except Exception as error:  # pylint: disable=broad-except
+        print(colored("Failed capturing the failure: {}".format(
+            safe_repr(error)), 'yellow'), file=sys.stderr)
+        return
+
+    print(colored("Captured failure {id}, replay it using: "
+                  "python -m ipdbugger replay {id}".format(id=failure_id),
+                  'red'), file=sys.stderr)
+
+
+def load_value(dumped_value, name, unpicklable_names):
+    """Unpickle a captured value, noting values that only have a repr."""
+    value = pickle.loads(dumped_value)
+    if isinstance(value, UnpicklableValue):
+        unpicklable_names.append(name)
+
+    return value
+
+
+def resolve_function(record):
+    """Return the function of a captured failure.
+
+    Raises:
+        ValueError: the function can't be reached by its qualified name.
+    """
+    qualname = record["qualname"]
+    if "<locals>" in qualname:
+        raise ValueError("Can't replay the nested function {!r}".format(
+            qualname))
+
+    name_parts = qualname.split(".")
+    if record["module"] == "__main__":
+        script_globals = runpy.run_path(record["filename"],
+                                        run_name="__ipdbugger_replay__")
+        target = script_globals[name_parts[0]]
+
+    else:
+        target = importlib.import_module(record["module"])
+        target = getattr(target, name_parts[0])
+
+    for name_part in name_parts[1:]:
+        target = getattr(target, name_part)
+
+    return getattr(target, "__func__", target)
+
+
+def replay_failure(failure_id, store=None):
+    """Re-run a captured failure under `debug`, with an interactive session.
+
+    Args:
+        failure_id (str): id of the captured failure.
+        store (FailureStore): store the failure was saved in, the default
+            store is used if not given.
+
+    Returns:
+        object. the return value of the replayed function.
+    """
+    from . import debug
+
+    if store is None:
+        store = FailureStore()
+
+    record = store.load(failure_id)
+    function = resolve_function(record)
+
+    unpicklable_names = []
+    args = [load_value(value, "argument #{}".format(index),
+                       unpicklable_names)
+            for index, value in enumerate(record["args"])]
+    kwargs = {name: load_value(value, "argument {!r}".format(name),
+                               unpicklable_names)
+              for name, value in record["kwargs"].items()}
+    function.__globals__.update(
+        (name, load_value(value, "global {!r}".format(name),
+                          unpicklable_names))
+        for name, value in record["globals"].items())
+
+    print(colored(record["traceback"], 'red'))
+    if unpicklable_names:
+        print(colored("Only the repr of {} was captured".format(
+            ", ".join(unpicklable_names)), 'yellow'))
+
+    return debug(function)(*args, **kwargs)
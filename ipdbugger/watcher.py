@@ -0,0 +1,337 @@
+"""Incremental re-instrumentation of debugged functions whose source changed.
+
+Reloading a module runs `debug` on all of its functions again. Instead, a
+watcher keeps the state of the files of the instrumented functions, and on
+`check` it re-instruments only the functions whose definitions changed,
+patching their code objects in place:
+
+    watcher = SourceWatcher()
+    watcher.watch(my_module)
+    ...
+    watcher.check()  # after editing my_module's file
+"""
+# pylint: disable=protected-access
+import os
+import ast
+import copy
+import types
+import inspect
+import hashlib
+import warnings
+
+from . import (compile_function_tree, dedent_source_lines, get_last_lineno,
+               get_instrumented_code, set_instrumented_code, is_instrumented)
+
+
+FUNCTION_NODES = (ast.FunctionDef, getattr(ast, "AsyncFunctionDef",
+                                           ast.FunctionDef))
+
+
+def get_function_nodes(tree):
+    """Return the function definitions in a module's tree.
+
+    Args:
+        tree (ast.Module): parsed module.
+
+    Returns:
+        dict. function definition nodes by their qualified names.
+    """
+    nodes = {}
+
+    def visit(parent, prefix):
+        for node in ast.iter_child_nodes(parent):
+            if isinstance(node, FUNCTION_NODES):
+                qualname = prefix + node.name
+                nodes[qualname] = node
+                visit(node, qualname + ".<locals>.")
+
+            elif isinstance(node, ast.ClassDef):
+                visit(node, prefix + node.name + ".")
+
+            else:
+                visit(node, prefix)
+
+    visit(tree, "")
+    return nodes
+
+
+def get_start_lineno(node):
+    """Return the first line of the definition, including its decorators."""
+    return min([node.lineno] + [decorator.lineno
+                                for decorator in node.decorator_list])
+
+
+def get_node_hash(node):
+    """Return a hash of the definition, ignoring its position in the file.
+
+    The positions of the statements relative to the start of the definition
+    are part of the hash, since the line numbers of the compiled code depend
+    on them, e.g. when blank lines are inserted inside its body.
+    """
+    relative_node = copy.deepcopy(node)
+    ast.increment_lineno(relative_node, 1 - get_start_lineno(node))
+    return hashlib.sha1(ast.dump(relative_node, include_attributes=True)
+                        .encode("utf-8")).hexdigest()
+
+
+def get_end_lineno(node):
+    """Return the last line of the definition."""
+    return getattr(node, "end_lineno", None) or get_last_lineno(node)
+
+
+def shift_code_lines(code, offset):
+    """Return a copy of the code object with its lines moved by the offset."""
+    consts = tuple(shift_code_lines(const, offset)
+                   if isinstance(const, types.CodeType) else const
+                   for const in code.co_consts)
+
+    return code.replace(co_firstlineno=code.co_firstlineno + offset,
+                        co_consts=consts)
+
+
+def get_qualname(function):
+    """Return the qualified name of the function."""
+    return getattr(function, "__qualname__", function.__name__)
+
+
+class WatchedFunction(object):
+    """Instrumented function and the state of its definition.
+
+    Attributes:
+        function (function): instrumented function.
+        node_hash (str): hash of the function's definition.
+        start_num (number): first line of the definition in its file.
+    """
+    def __init__(self, function, node):
+        self.function = function
+        self.node_hash = get_node_hash(node)
+        self.start_num = get_start_lineno(node)
+
+    def update(self, node, lines):
+        """Update the function to its current definition, if it changed.
+
+        Args:
+            node (ast.AST): current definition of the function.
+            lines (list): current lines of the function's file.
+
+        Returns:
+            bool. whether the function was re-instrumented.
+        """
+        node_hash = get_node_hash(node)
+        start_num = get_start_lineno(node)
+        function = self.function
+
+        if node_hash == self.node_hash and start_num == self.start_num:
+            return False
+
+        # Only the lines of the function moved, no need to recompile
+        if node_hash == self.node_hash and \
+                hasattr(function.__code__, "replace"):
+            offset = start_num - self.start_num
+            set_instrumented_code(
+                function,
+                shift_code_lines(function.__code__, offset),
+                shift_code_lines(function._ipdebug_original_code, offset),
+                function._ipdebug_injected_tries,
+                function._ipdebug_ignore_exceptions,
+                function._ipdebug_catch_exception,
+                function._ipdebug_depth,
+                function._ipdebug_compact)
+
+            self.start_num = start_num
+            return False
+
+        filename = function.__code__.co_filename
+        free_vars = function._ipdebug_original_code.co_freevars
+        source = dedent_source_lines(lines[start_num - 1:
+                                           get_end_lineno(node)])
+
+        original_tree = ast.parse(source)
+        ast.increment_lineno(original_tree, start_num - 1)
+        del original_tree.body[0].decorator_list[:]
+        original_code = compile_function_tree(original_tree, filename,
+                                              free_vars)
+
+        # The function object keeps its closure, which can't be changed
+        if original_code.co_freevars != free_vars:
+            warnings.warn("Can't re-instrument {}, its closure variables "
+                          "changed".format(get_qualname(function)))
+            return False
+
+        code, injected_tries = get_instrumented_code(
+            source, start_num, filename, free_vars,
+            function._ipdebug_ignore_exceptions,
+            function._ipdebug_catch_exception,
+            function._ipdebug_depth,
+            function._ipdebug_compact)
+
+        set_instrumented_code(function, code, original_code, injected_tries,
+                              function._ipdebug_ignore_exceptions,
+                              function._ipdebug_catch_exception,
+                              function._ipdebug_depth,
+                              function._ipdebug_compact)
+
+        self.node_hash = node_hash
+        self.start_num = start_num
+        return True
+
+
+class WatchedFile(object):
+    """Source file of instrumented functions and its last known state.
+
+    Attributes:
+        filename (str): path of the source file.
+        mtime (float): last modification time of the file.
+        content_hash (str): hash of the file's content.
+        functions (dict): watched functions by their qualified names.
+        updated_functions (list): functions re-instrumented by `watch`, to
+            report on the next update.
+        nodes (dict): function definitions of the file by their qualified
+            names, as of the last read.
+        lines (list): lines of the file, as of the last read.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.mtime = None
+        self.content_hash = None
+        self.functions = {}
+        self.updated_functions = []
+        self.nodes = {}
+        self.lines = []
+
+    def read(self):
+        """Read the file, returning whether its content changed."""
+        try:
+            mtime = os.path.getmtime(self.filename)
+
+        except OSError:
+            return False
+
+        if mtime == self.mtime:
+            return False
+
+        self.mtime = mtime
+        with open(self.filename, "rb") as source_file:
+            content = source_file.read()
+
+        content_hash = hashlib.sha1(content).hexdigest()
+        if content_hash == self.content_hash:
+            return False
+
+        self.content_hash = content_hash
+        self.nodes = get_function_nodes(ast.parse(content))
+        self.lines = content.decode("utf-8").splitlines(True)
+        return True
+
+    def watch(self, function):
+        """Start watching an instrumented function of the file.
+
+        The function is taken to run its definition as of the last read of
+        the file, so if the file changed since, it's updated along with the
+        other watched functions.
+        """
+        qualname = get_qualname(function)
+        node = self.nodes.get(qualname)
+        changed = self.read()
+        if node is None:
+            node = self.nodes.get(qualname)
+
+        if node is not None:
+            self.functions[qualname] = WatchedFunction(function, node)
+
+        if changed:
+            self.updated_functions.extend(self.update_functions())
+
+    def update(self):
+        """Re-instrument the functions whose definitions changed.
+
+        Returns:
+            list. the re-instrumented functions, including those updated
+                when watching other functions.
+        """
+        updated_functions, self.updated_functions = \
+            self.updated_functions, []
+
+        if self.read():
+            updated_functions.extend(
+                function for function in self.update_functions()
+                if function not in updated_functions)
+
+        return updated_functions
+
+    def update_functions(self):
+        """Update the watched functions to the file's last read state.
+
+        Returns:
+            list. the re-instrumented functions.
+        """
+        updated_functions = []
+        for qualname, watched_function in self.functions.items():
+            node = self.nodes.get(qualname)
+            if node is not None and watched_function.update(node,
+                                                            self.lines):
+                updated_functions.append(watched_function.function)
+
+        return updated_functions
+
+
+class SourceWatcher(object):
+    """Watch the source files of instrumented functions for changes.
+
+    Attributes:
+        files (dict): watched files by their paths.
+    """
+    def __init__(self):
+        self.files = {}
+
+    def watch(self, target):
+        """Watch the instrumented functions of a function, class or module.
+
+        Args:
+            target (typing.Union(module, type, function)): instrumented
+                function, or a class or module containing such functions.
+        """
+        if inspect.ismethod(target):
+            target = target.__func__
+
+        if inspect.isfunction(target):
+            if is_instrumented(target):
+                filename = target.__code__.co_filename
+                if filename not in self.files:
+                    self.files[filename] = WatchedFile(filename)
+
+                self.files[filename].watch(target)
+
+            return
+
+        if isinstance(target, type):
+            for member in vars(target).values():
+                if inspect.isfunction(member):
+                    self.watch(member)
+
+            return
+
+        if inspect.ismodule(target):
+            for member in vars(target).values():
+                if getattr(member, "__module__", None) == target.__name__ \
+                        and (inspect.isfunction(member) or
+                             isinstance(member, type)):
+                    self.watch(member)
+
+            return
+
+        raise TypeError(
+            "Watcher can only watch functions, classes and modules. "
+            "Got object {!r} of type {}".format(target, type(target).__name__))
+
+    def check(self):
+        """Re-instrument the watched functions whose source changed.
+
+        Returns:
+            list. the re-instrumented functions.
+        """
+        updated_functions = []
+        for watched_file in self.files.values():
+            updated_functions.extend(watched_file.update())
+
+        return updated_functions
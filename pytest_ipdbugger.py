@@ -0,0 +1,28 @@
+"""pytest entry point of ipdbugger's plugin, see `ipdbugger.pytest_plugin`.
+
+pytest loads this module in every run of an environment ipdbugger is
+installed in. Importing ipdbugger loads IPython and replaces the standard
+streams for colors, so it's only imported when the option is given.
+"""
+from __future__ import absolute_import
+
+
+def pytest_addoption(parser):
+    """Add the ipdbugger command line option."""
+    group = parser.getgroup("ipdbugger")
+    group.addoption("--ipdbugger", action="store", nargs="?", type=int,
+                    const=0, default=None, dest="ipdbugger_depth",
+                    metavar="DEPTH",
+                    help="start an ipdb session on failing statements of "
+                         "tests, DEPTH is how many levels of inner calls to "
+                         "debug as well (default: 0). Use the '=' form when "
+                         "followed by test paths.")
+
+
+def pytest_configure(config):
+    """Register the instrumentation if the ipdbugger option is given."""
+    if config.getoption("ipdbugger_depth") is not None:
+        from ipdbugger.pytest_plugin import IpdbuggerPlugin
+
+        config.pluginmanager.register(IpdbuggerPlugin(config),
+                                      "ipdbugger-instrumentation")
@@ -23,6 +23,8 @@ setup(
                 "mock"]
     },
     packages=["ipdbugger"],
+    py_modules=["pytest_ipdbugger"],
+    entry_points={"pytest11": ["ipdbugger = pytest_ipdbugger"]},
     python_requires=">=2.7,!=3.0.*,!=3.1.*,!=3.2.*,!=3.3.*,!=3.4.*",
     package_data={'': ['*.xls', '*.xsd', '*.json',
                        '*.css', '*.xml', '*.rst']},
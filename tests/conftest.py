@@ -0,0 +1,20 @@
+"""Fixtures for the Ipdbugger unittests."""
+import threading
+
+import pytest
+
+try:
+    from unittest.mock import patch
+
+except ImportError:
+    from mock import patch
+
+
+pytest_plugins = ["pytester"]
+
+
+@pytest.fixture(autouse=True)
+def fresh_debuggers():
+    """Don't reuse debuggers created by other tests, which may be mocked."""
+    with patch('ipdbugger.DEBUGGERS', threading.local()):
+        yield
@@ -0,0 +1,71 @@
+"""Unit tests for the per-context enablement of ipdbugger."""
+from __future__ import absolute_import
+
+import threading
+
+import pytest
+
+from ipdbugger import debug, enabled, disabled
+
+try:
+    from unittest.mock import patch
+
+except ImportError:
+    from mock import patch
+
+
+@debug
+def should_raise():
+    """Auxiliary instrumented function that raises."""
+    raise ValueError()
+
+
+def test_disabled_scope():
+    """Test that exceptions propagate in a disabled scope."""
+    with patch('bdb.Bdb.set_trace') as set_trace, disabled(), \
+            pytest.raises(ValueError):
+        should_raise()
+
+    assert not set_trace.called
+
+
+def test_enabled_scope():
+    """Test debugging only in an enabled scope when disabled by default."""
+    with patch('ipdbugger.context.ENABLED_BY_DEFAULT', False):
+        with pytest.raises(ValueError):
+            should_raise()
+
+        with patch('IPython.terminal.debugger.TerminalPdb.__init__'), \
+                patch('bdb.Bdb.set_trace') as set_trace, enabled():
+            should_raise()
+            assert set_trace.called
+
+
+def test_scopes_are_restored():
+    """Test that leaving a nested scope restores the outer scope."""
+    with patch('IPython.terminal.debugger.TerminalPdb.__init__'), \
+            patch('bdb.Bdb.set_trace') as set_trace, enabled():
+        with disabled(), pytest.raises(ValueError):
+            should_raise()
+
+        should_raise()
+        assert set_trace.called
+
+
+def test_scope_is_not_shared_with_other_threads():
+    """Test that a disabled scope doesn't affect other threads."""
+    errors = []
+
+    def run_in_thread():
+        try:
+            should_raise()
+
+        except ValueError as error:
+            errors.append(error)
+
+    with patch('ipdbugger.context.ENABLED_BY_DEFAULT', False), enabled():
+        thread = threading.Thread(target=run_in_thread)
+        thread.start()
+        thread.join()
+
+    assert len(errors) == 1
@@ -1,10 +1,14 @@
 """Unit tests for the debug decorator in ipdbugger module."""
 from __future__ import absolute_import
 
+import sys
+import dis
+
 import pytest
 
 from tests import utils
-from ipdbugger import debug
+import ipdbugger
+from ipdbugger import debug, IPDBugger
 
 try:
     from unittest.mock import patch, MagicMock
@@ -399,3 +403,387 @@ def test_using_debug_as_decorator_with_kwargs():
             patch('bdb.Bdb.set_trace') as set_trace:
         func()
         assert set_trace.called
+
+
+@pytest.mark.skipif(not hasattr(sys, "monitoring"),
+                    reason="sys.monitoring requires Python 3.12+")
+def test_continue_disables_monitoring():
+    """Test that continuing a session leaves no monitoring events behind."""
+    stopped_lines = []
+
+    def user_line(debugger, frame):
+        stopped_lines.append(frame.f_lineno)
+        if len(stopped_lines) == 1:
+            debugger.set_next(frame)
+
+        else:
+            debugger.set_continue()
+
+    def func():
+        IPDBugger(exc_info=None).set_trace()
+        value = 1
+        value += 1
+        value += 1
+        return value
+
+    with patch.object(IPDBugger, 'user_line', user_line):
+        assert func() == 3
+
+    first_line = func.__code__.co_firstlineno
+    assert stopped_lines == [first_line + 2, first_line + 3]
+    assert sys.monitoring.get_tool(sys.monitoring.DEBUGGER_ID) is None
+
+
+@pytest.mark.skipif(not hasattr(sys, "monitoring"),
+                    reason="sys.monitoring requires Python 3.12+")
+def test_stepping_monitors_only_the_stepped_code():
+    """Test that stepping enables line events only where the session is."""
+    monitoring = sys.monitoring
+    stops = []
+
+    def user_line(debugger, frame):
+        stops.append((frame.f_code.co_name,
+                      monitoring.get_local_events(monitoring.DEBUGGER_ID,
+                                                  func.__code__),
+                      monitoring.get_events(monitoring.DEBUGGER_ID)))
+        if len(stops) < 4:
+            debugger.set_step()
+
+        else:
+            debugger.set_continue()
+
+    def callee():
+        value = 1
+        return value
+
+    def func():
+        IPDBugger(exc_info=None).set_trace()
+        value = callee()
+        return value
+
+    with patch.object(IPDBugger, 'user_line', user_line), \
+            patch.object(IPDBugger, 'user_return'):
+        assert func() == 1
+
+    # Stepping into the callee leaves no line events on the caller's code
+    assert [stop[0] for stop in stops] == ["func", "callee", "callee", "func"]
+    assert stops[2][1] == 0
+    assert all(stop[2] == monitoring.events.RAISE |
+               monitoring.events.PY_UNWIND for stop in stops)
+    assert monitoring.get_tool(monitoring.DEBUGGER_ID) is None
+
+
+def breakpoint_callee():
+    value = 1
+    return value
+
+
+def get_breakpoint_stops(use_monitoring):
+    """Return the stops of stepping over a call with a breakpoint in it."""
+    stops = []
+
+    def user_line(debugger, frame):
+        stops.append((frame.f_code.co_name,
+                      frame.f_lineno - frame.f_code.co_firstlineno))
+        if len(stops) == 1:
+            debugger.set_break(
+                __file__, breakpoint_callee.__code__.co_firstlineno + 2)
+            debugger.set_next(frame)
+
+        else:
+            debugger.clear_all_breaks()
+            debugger.set_continue()
+
+    def func():
+        IPDBugger(exc_info=None).set_trace()
+        value = breakpoint_callee()
+        return value
+
+    with patch.object(ipdbugger, 'HAS_MONITORING', use_monitoring), \
+            patch.object(IPDBugger, 'user_line', user_line), \
+            patch.object(IPDBugger, 'user_return'):
+        assert func() == 1
+
+    sys.settrace(None)
+    return stops
+
+
+@pytest.mark.skipif(not hasattr(sys, "monitoring"),
+                    reason="sys.monitoring requires Python 3.12+")
+def test_monitoring_stops_at_breakpoint_in_callee():
+    """Test stepping over a call stops at a breakpoint in the callee."""
+    assert get_breakpoint_stops(use_monitoring=True) == \
+        get_breakpoint_stops(use_monitoring=False) == \
+        [("func", 2), ("breakpoint_callee", 2)]
+
+
+def get_exception_stops(use_monitoring):
+    """Return the stops of stepping over a failing instrumented statement."""
+    stops = []
+
+    def user_line(debugger, frame):
+        line = frame.f_lineno - func.__code__.co_firstlineno
+        stops.append(("line", line))
+
+        # Continue after stepping past the failing statement
+        if line < 4:
+            debugger.set_next(frame)
+
+        else:
+            debugger.set_continue()
+
+    def user_exception(debugger, frame, exc_info):
+        stops.append(("exception",
+                      frame.f_lineno - func.__code__.co_firstlineno,
+                      exc_info[0]))
+        debugger.set_next(frame)
+
+    @debug
+    def func():
+        IPDBugger(exc_info=None).set_trace()
+        value = 1
+        value = 1 // 0
+        value = 2
+        return value
+
+    with patch.object(ipdbugger, 'HAS_MONITORING', use_monitoring), \
+            patch.object(IPDBugger, 'user_line', user_line), \
+            patch.object(IPDBugger, 'user_exception', user_exception), \
+            patch.object(IPDBugger, 'user_return'), \
+            patch.object(IPDBugger, 'interaction'), \
+            patch('ipdbugger.traceback.format_exception', return_value=[]):
+        assert func() == 2
+
+    sys.settrace(None)
+    return stops
+
+
+@pytest.mark.skipif(not hasattr(sys, "monitoring"),
+                    reason="sys.monitoring requires Python 3.12+")
+def test_monitoring_reports_exceptions_like_settrace():
+    """Test stepping over a failing statement reports its exception."""
+    stops = get_exception_stops(use_monitoring=True)
+    assert stops == get_exception_stops(use_monitoring=False)
+    assert ("exception", 3, ZeroDivisionError) in stops
+
+
+def test_reusing_debugger_between_sessions():
+    """Test that consecutive sessions in a thread use the same debugger."""
+    debuggers = []
+
+    def user_line(debugger, _frame):
+        debuggers.append(debugger)
+        debugger.set_continue()
+
+    @debug
+    def func():
+        raise ValueError()
+
+    with patch.object(IPDBugger, 'user_line', user_line):
+        func()
+        func()
+
+    assert len(debuggers) == 2
+    assert debuggers[0] is debuggers[1]
+    assert debuggers[0].exc_info is None
+
+
+def test_reusing_debugger_after_continuing_with_breakpoints():
+    """Test that continuing with breakpoints set ends the session."""
+    debuggers = []
+
+    def never_called():
+        return None
+
+    def user_line(debugger, _frame):
+        debuggers.append(debugger)
+        debugger.set_break(__file__, never_called.__code__.co_firstlineno + 1)
+        debugger.set_continue()
+
+    @debug
+    def func():
+        raise ValueError()
+
+    try:
+        with patch.object(IPDBugger, 'user_line', user_line):
+            func()
+            assert debuggers[0].exc_info is None
+            assert not debuggers[0].in_session
+            func()
+
+    finally:
+        debuggers[0].clear_all_breaks()
+        sys.settrace(None)
+
+    assert len(debuggers) == 2
+    assert debuggers[0] is debuggers[1]
+
+
+def test_debugging_function_with_replaced_code():
+    """Test re-wrapping a function whose code was replaced, e.g. reloaded."""
+    @debug
+    def func():
+        raise Exception()
+
+    def reloaded_func():
+        raise Exception()
+
+    func.__code__ = reloaded_func.__code__
+    debug(func)
+
+    with patch('IPython.terminal.debugger.TerminalPdb.__init__'), \
+            patch('bdb.Bdb.set_trace') as set_trace:
+        func()
+        assert set_trace.called
+
+
+@pytest.mark.skipif(not ipdbugger.CAN_RESUME_INTO_TRY,
+                    reason="compact blocks require Python 3.11+")
+def test_compact_resumes_after_failing_statement():
+    """Test continuing a compact session runs the statement after the error.
+    """
+    stopped_lines = []
+
+    def interaction(debugger, frame, _traceback):
+        stopped_lines.append(frame.f_lineno)
+        debugger.set_continue()
+
+    def func(values):
+        result = []
+        for value in values:
+            if value >= 0:
+                result.append(1 // value)
+                result.append(value)
+
+            result.append(None)
+
+        result.append(len(result))
+        return result
+
+    func = debug(func, compact=True)
+
+    with patch.object(IPDBugger, 'interaction', interaction), \
+            patch('ipdbugger.traceback.format_exception', return_value=[]):
+        assert func([1, 0, -1]) == [1, 1, None, 0, None, None, 6]
+
+    first_line = func.__code__.co_firstlineno
+    assert stopped_lines == [first_line + 5]
+
+
+def test_compact_ignoring_excepted_exception():
+    """Test compact blocks let the function's own handlers catch errors."""
+    def func():
+        try:
+            raise ValueError()
+
+        except ValueError:
+            return True
+
+    func = debug(func, compact=True)
+
+    with patch('IPython.terminal.debugger.TerminalPdb.__init__'), \
+            patch('bdb.Bdb.set_trace') as set_trace:
+        assert func()
+        assert not set_trace.called
+
+
+def test_debugging_inside_try_resumes_next_statement():
+    """Test continuing after a non-excepted error in a try's body."""
+    def interaction(debugger, _frame, _traceback):
+        debugger.set_continue()
+
+    @debug
+    def func():
+        result = []
+        try:
+            result.append(1)
+            result.append(1 // 0)
+            result.append(2)
+
+        except KeyError:
+            result.append(None)
+
+        else:
+            result.append(3)
+
+        return result
+
+    with patch.object(IPDBugger, 'interaction', interaction), \
+            patch('ipdbugger.traceback.format_exception', return_value=[]):
+        assert func() == [1, 2, 3]
+
+
+def test_debugging_function_defined_inside_try():
+    """Test resuming in a function defined in the body of a try."""
+    def interaction(debugger, _frame, _traceback):
+        debugger.set_continue()
+
+    @debug
+    def func():
+        results = []
+        try:
+            def inner():
+                result = []
+                try:
+                    result.append(1 // 0)
+                    result.append("next")
+                    result.append("next2")
+
+                except KeyError:
+                    pass
+
+                return result
+
+            results.append(inner())
+
+        except KeyError:
+            pass
+
+        return results
+
+    with patch.object(IPDBugger, 'interaction', interaction), \
+            patch('ipdbugger.traceback.format_exception', return_value=[]):
+        assert func() == [["next", "next2"]]
+
+
+@pytest.mark.skipif(not ipdbugger.CAN_RESUME_INTO_TRY,
+                    reason="merging handlers requires Python 3.11+")
+def test_excepted_exception_skips_statement_handlers():
+    """Test excepted exceptions pass no handlers on their way to the try's.
+    """
+    @debug
+    def func(mapping):
+        try:
+            if mapping:
+                return mapping["key"]
+
+        except KeyError:
+            return None
+
+    # Only the try statement itself is wrapped
+    assert func._ipdebug_injected_tries == 1
+
+    with patch('IPython.terminal.debugger.TerminalPdb.__init__'), \
+            patch('bdb.Bdb.set_trace') as set_trace:
+        assert func({"other": 1}) is None
+        assert not set_trace.called
+
+
+def test_instrumented_call_imports_nothing():
+    """Test that calls that don't fail run no imports of the debugger."""
+    @debug(ignore_exceptions=[KeyError], catch_exception=TypeError)
+    def func(mapping):
+        try:
+            return mapping["key"]
+
+        except KeyError:
+            return None
+
+    assert "IMPORT_NAME" not in [instruction.opname for instruction in
+                                 dis.get_instructions(func.__code__)]
+    assert func({}) is None
+
+    with patch('IPython.terminal.debugger.TerminalPdb.__init__'), \
+            patch('bdb.Bdb.set_trace') as set_trace:
+        func(None)
+        assert set_trace.called
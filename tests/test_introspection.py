@@ -0,0 +1,97 @@
+"""Unit tests for the overhead introspection in ipdbugger module."""
+from __future__ import absolute_import
+
+import pytest
+
+from tests import utils
+import ipdbugger
+from ipdbugger import debug, overhead
+
+
+def test_function_overhead():
+    """Test reporting the overhead of an instrumented function."""
+    @debug
+    def func(value):
+        value += 1
+        return value
+
+    report = overhead(func)
+
+    assert report.injected_tries == 2
+    assert report.instrumented_size > report.original_size
+    assert report.instrumented_exception_table_size >= \
+        report.original_exception_table_size
+    assert report.instrumented_line_table_size > \
+        report.original_line_table_size
+    assert not report.depth_active
+    assert report.call_ratio is None
+
+
+def test_function_overhead_benchmark():
+    """Test measuring the call ratio against the original code."""
+    def func(value):
+        return value + 1
+
+    func = debug(func, depth=1)
+
+    report = overhead(func, args=(1,), number=10)
+    assert report.depth_active
+    assert report.call_ratio > 0
+
+
+def test_class_overhead():
+    """Test reporting the overhead of each method of a class."""
+    @debug
+    class DebuggedClass(object):
+        def first_method(self):
+            pass
+
+        def second_method(self):
+            pass
+
+    assert sorted(overhead(DebuggedClass)) == ["first_method",
+                                               "second_method"]
+
+
+def test_module_overhead():
+    """Test reporting the overhead of functions defined in a module."""
+    assert overhead(utils) == {}
+
+
+def test_overhead_of_non_instrumented_function():
+    """Test raising an indicative error for a non instrumented function."""
+    def func():
+        pass
+
+    with pytest.raises(ValueError, match="Function 'func' is not "
+                                         "instrumented"):
+        overhead(func)
+
+
+def test_overhead_of_non_compatible_type():
+    """Test raising an indicative error for a bad type."""
+    with pytest.raises(TypeError,
+                       match="Overhead can only be reported for functions, "
+                             "classes and modules. Got object 1 of type int"):
+        overhead(1)
+
+
+@pytest.mark.skipif(not ipdbugger.CAN_RESUME_INTO_TRY,
+                    reason="compact blocks require Python 3.11+")
+def test_compact_overhead():
+    """Test the compact engine injects a single try for a flat function."""
+    def create_func():
+        def func(value):
+            value += 1
+            value *= 2
+            value -= 3
+            return value
+
+        return func
+
+    statements_report = overhead(debug(create_func()))
+    compact_report = overhead(debug(create_func(), compact=True))
+
+    assert compact_report.injected_tries == 1
+    assert compact_report.instrumented_size < \
+        statements_report.instrumented_size
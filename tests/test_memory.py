@@ -0,0 +1,104 @@
+"""Memory regression tests for the debugging sessions of ipdbugger."""
+from __future__ import absolute_import
+
+import gc
+import weakref
+
+from ipdbugger import debug
+
+try:
+    from unittest.mock import patch
+
+except ImportError:
+    from mock import patch
+
+try:
+    import resource
+
+except ImportError:
+    resource = None
+
+
+SESSIONS_NUMBER = 1000
+MAX_OBJECTS_GROWTH = 100
+MAX_RSS_GROWTH_KB = 10 * 1024
+
+
+class Marker(object):
+    """Auxiliary class for tracking the lifetime of a frame's locals."""
+
+
+def input_continue(_prompt):
+    """Answer the session's prompt with 'continue'."""
+    return "c"
+
+
+def prompt_continue():
+    """Run the sessions' real interaction, continuing at its prompt."""
+    return patch.multiple('IPython.terminal.debugger',
+                          _use_simple_prompt=True, input=input_continue,
+                          create=True)
+
+
+def get_max_rss():
+    """Return the peak resident set size of the process in KB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def test_session_releases_frame_locals():
+    """Test that the locals of the debugged frame die with the session."""
+    markers = []
+
+    @debug
+    def func():
+        marker = Marker()
+        markers.append(weakref.ref(marker))
+        raise ValueError()
+
+    with prompt_continue():
+        gc.disable()
+        try:
+            func()
+            assert markers[0]() is None
+
+        finally:
+            gc.enable()
+
+
+def test_many_sessions_memory_is_flat():
+    """Test that many caught-and-continued exceptions don't leak memory."""
+    @debug
+    def func():
+        raise ValueError()
+
+    with prompt_continue():
+        # Warm up caches of the debugger and the interpreter
+        for _ in range(SESSIONS_NUMBER // 10):
+            func()
+
+        gc.collect()
+        objects_count = len(gc.get_objects())
+        max_rss = get_max_rss() if resource else 0
+
+        for _ in range(SESSIONS_NUMBER):
+            func()
+
+        gc.collect()
+        assert len(gc.get_objects()) - objects_count < MAX_OBJECTS_GROWTH
+
+        if resource:
+            assert get_max_rss() - max_rss < MAX_RSS_GROWTH_KB
+
+
+def test_excepthook_is_wrapped_once():
+    """Test that the system's excepthook is wrapped only once."""
+    @debug
+    def func():
+        raise ValueError()
+
+    with prompt_continue(), \
+            patch('ipdb.__main__.wrap_sys_excepthook') as wrap_excepthook, \
+            patch('ipdbugger.EXCEPTHOOK_WRAPPED', False):
+        func()
+        func()
+        assert wrap_excepthook.call_count == 1
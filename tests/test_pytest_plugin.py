@@ -0,0 +1,119 @@
+"""Unit tests for the pytest plugin of ipdbugger."""
+from __future__ import absolute_import
+
+import os
+
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+CONFTEST = '''
+import pytest
+
+from ipdbugger import IPDBugger
+
+
+@pytest.fixture(autouse=True)
+def continue_sessions(monkeypatch):
+    """Record the frames sessions start in, and continue them."""
+    def user_line(debugger, frame):
+        print("debugging " + frame.f_code.co_name)
+        debugger.set_continue()
+
+    monkeypatch.setattr(IPDBugger, "user_line", user_line)
+'''
+
+TESTS = '''
+def test_failing():
+    assert False
+
+
+class TestClass(object):
+    def test_method(self):
+        raise ValueError()
+'''
+
+
+def test_plugin_disabled_by_default(testdir):
+    """Test that tests aren't instrumented without the option."""
+    testdir.makeconftest(CONFTEST)
+    testdir.makepyfile(TESTS)
+
+    result = testdir.runpytest("-p", "pytest_ipdbugger")
+    result.assert_outcomes(failed=2)
+
+
+def test_plugin_imports_ipdbugger_lazily(testdir, monkeypatch):
+    """Test that ipdbugger isn't imported without the option."""
+    monkeypatch.setenv("PYTHONPATH", ROOT_DIRECTORY)
+    testdir.makepyfile('''
+        import sys
+
+        def test_ipdbugger_not_imported():
+            assert "pytest_ipdbugger" in sys.modules
+            assert "ipdbugger" not in sys.modules
+    ''')
+
+    result = testdir.runpytest_subprocess("-p", "pytest_ipdbugger")
+    result.assert_outcomes(passed=1)
+
+
+def test_plugin_debugs_failing_statements(testdir):
+    """Test starting sessions in the frames of the failing statements."""
+    testdir.makeconftest(CONFTEST)
+    testdir.makepyfile(TESTS)
+
+    result = testdir.runpytest("-p", "pytest_ipdbugger",
+                               "--ipdbugger", "-s")
+    result.assert_outcomes(passed=2)
+    result.stdout.fnmatch_lines(["*debugging test_failing*",
+                                 "*debugging test_method*",
+                                 "*ipdbugger: instrumented 2 tests*"])
+
+
+def test_plugin_debugs_decorated_tests(testdir):
+    """Test starting sessions in tests wrapped by decorators."""
+    testdir.makeconftest(CONFTEST)
+    testdir.makepyfile('''
+        import os
+
+        try:
+            from unittest import mock
+
+        except ImportError:
+            import mock
+
+
+        @mock.patch("os.getcwd")
+        def test_patched(getcwd):
+            assert False
+    ''')
+
+    result = testdir.runpytest("-p", "pytest_ipdbugger", "--ipdbugger", "-s")
+    result.assert_outcomes(passed=1)
+    result.stdout.fnmatch_lines(["*debugging test_patched*"])
+
+
+def test_plugin_caches_transforms(testdir):
+    """Test reusing instrumented code between runs."""
+    testdir.makeconftest(CONFTEST)
+    testdir.makepyfile(TESTS)
+
+    testdir.runpytest("-p", "pytest_ipdbugger", "--ipdbugger=1")
+    result = testdir.runpytest("-p", "pytest_ipdbugger",
+                               "--ipdbugger=1")
+    result.stdout.fnmatch_lines(["*(2 cached transforms, 0 new)*"])
+
+
+def test_plugin_retransforms_after_upgrade(testdir, monkeypatch):
+    """Test not reusing code instrumented by another ipdbugger version."""
+    from ipdbugger import cache
+
+    testdir.makeconftest(CONFTEST)
+    testdir.makepyfile(TESTS)
+
+    testdir.runpytest("-p", "pytest_ipdbugger", "--ipdbugger=1")
+    monkeypatch.setattr(cache, "TRANSFORMER_HASH", "upgraded")
+    result = testdir.runpytest("-p", "pytest_ipdbugger",
+                               "--ipdbugger=1")
+    result.stdout.fnmatch_lines(["*(0 cached transforms, 2 new)*"])
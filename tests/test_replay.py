@@ -0,0 +1,168 @@
+"""Unit tests for capturing failures and replaying them in ipdbugger."""
+from __future__ import absolute_import
+
+import os
+
+import pytest
+
+from ipdbugger import (debug, enable_failure_capture,
+                       disable_failure_capture, replay_failure)
+from ipdbugger.__main__ import main
+from ipdbugger.replay import UnpicklableValue
+
+try:
+    from unittest.mock import patch
+
+except ImportError:
+    from mock import patch
+
+
+DIVISOR_OFFSET = 0
+
+
+@debug
+def divide(dividend, divisor, *args, **kwargs):
+    """Auxiliary instrumented function to capture failures of."""
+    return dividend / (divisor + DIVISOR_OFFSET)
+
+
+@pytest.fixture
+def store(tmpdir):
+    """Capture failures into a temporary store during the test."""
+    failure_store = enable_failure_capture(str(tmpdir), max_failures=2)
+    yield failure_store
+    disable_failure_capture()
+
+
+def get_failure_ids(failure_store):
+    """Return the ids of the failures in the store."""
+    return [os.path.splitext(file_name)[0]
+            for file_name in os.listdir(failure_store.directory)]
+
+
+def test_capturing_failure(store):
+    """Test that a failure is captured and re-raised without debugging."""
+    with patch('bdb.Bdb.set_trace') as set_trace, \
+            pytest.raises(ZeroDivisionError):
+        divide(1, 0, 2, key=lambda: None)
+
+    assert not set_trace.called
+
+    failure_ids = get_failure_ids(store)
+    assert len(failure_ids) == 1
+
+    record = store.load(failure_ids[0])
+    assert record["module"] == __name__
+    assert record["qualname"] == "divide"
+    assert "ZeroDivisionError" in record["traceback"]
+    assert "DIVISOR_OFFSET" in record["globals"]
+
+
+def test_capturing_failure_and_continuing(store):
+    """Test continuing the flow after capturing a failure."""
+    store.reraise = False
+    assert divide(1, 0) is None
+    assert len(get_failure_ids(store)) == 1
+
+
+def test_store_is_bounded(store):
+    """Test that only the newest failures are kept in the store."""
+    for _ in range(3):
+        with pytest.raises(ZeroDivisionError):
+            divide(1, 0)
+
+    assert len(get_failure_ids(store)) == store.max_failures
+
+
+def test_replaying_failure(store):
+    """Test replaying a captured failure in a debugging session."""
+    with pytest.raises(ZeroDivisionError):
+        divide(1, 0)
+
+    failure_id, = get_failure_ids(store)
+    disable_failure_capture()
+
+    with patch('IPython.terminal.debugger.TerminalPdb.__init__'), \
+            patch('bdb.Bdb.set_trace') as set_trace:
+        replay_failure(failure_id, store)
+        assert set_trace.called
+
+
+def test_replaying_unpicklable_argument(store):
+    """Test replaying a failure with arguments that only have a repr."""
+    with pytest.raises(ZeroDivisionError):
+        divide(1, 0, key=lambda: None)
+
+    failure_id, = get_failure_ids(store)
+    replayed_calls = []
+
+    def record_call(*args, **kwargs):
+        replayed_calls.append((args, kwargs))
+
+    with patch('ipdbugger.replay.resolve_function',
+               return_value=record_call):
+        replay_failure(failure_id, store)
+
+    (args, kwargs), = replayed_calls
+    assert args == (1, 0)
+    assert isinstance(kwargs["key"], UnpicklableValue)
+
+
+def test_replay_command(store):
+    """Test replaying a captured failure from the command line."""
+    with pytest.raises(ZeroDivisionError):
+        divide(1, 0)
+
+    failure_id, = get_failure_ids(store)
+    disable_failure_capture()
+
+    with patch('IPython.terminal.debugger.TerminalPdb.__init__'), \
+            patch('bdb.Bdb.set_trace') as set_trace:
+        main(["replay", failure_id, "--store", store.directory])
+        assert set_trace.called
+
+
+def test_failing_capture_keeps_original_exception(tmpdir):
+    """Test that errors of the capture itself don't replace the failure."""
+    unwritable_directory = tmpdir.join("file")
+    unwritable_directory.write("")
+    enable_failure_capture(str(unwritable_directory.join("store")))
+
+    try:
+        with pytest.raises(ZeroDivisionError):
+            divide(1, 0)
+
+    finally:
+        disable_failure_capture()
+
+
+def test_capturing_failure_of_deleted_argument(store):
+    """Test capturing a failure after the function deleted an argument."""
+    @debug
+    def delete_argument(payload):
+        del payload
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        delete_argument(1)
+
+    record = store.load(get_failure_ids(store)[0])
+    assert len(record["args"]) == 1
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"),
+                    reason="user ids are only checked on POSIX")
+def test_refusing_untrusted_store(store):
+    """Test that failures aren't loaded from a store others can write to."""
+    with pytest.raises(ZeroDivisionError):
+        divide(1, 0)
+
+    failure_id = get_failure_ids(store)[0]
+
+    with patch('os.getuid', return_value=os.getuid() + 1), \
+            pytest.raises(ValueError):
+        store.load(failure_id)
+
+    os.chmod(store.directory, 0o777)
+    with pytest.raises(ValueError):
+        store.load(failure_id)
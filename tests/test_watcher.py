@@ -0,0 +1,206 @@
+"""Unit tests for re-instrumenting changed functions in ipdbugger."""
+from __future__ import absolute_import
+
+import os
+import dis
+import sys
+import textwrap
+import importlib
+
+import pytest
+
+import ipdbugger
+from ipdbugger import IPDBugger
+from ipdbugger.watcher import SourceWatcher
+
+try:
+    from unittest.mock import patch
+
+except ImportError:
+    from mock import patch
+
+
+MODULE_SOURCE = '''
+from ipdbugger import debug
+
+
+@debug
+def changed():
+    return 1
+
+
+@debug
+def unchanged():
+    raise ValueError()
+'''
+
+CHANGED_MODULE_SOURCE = '''
+from ipdbugger import debug
+# Moving the functions below
+
+
+@debug
+def changed():
+    raise ValueError()
+
+
+@debug
+def unchanged():
+    raise ValueError()
+'''
+
+BODY_CHANGED_MODULE_SOURCE = '''
+from ipdbugger import debug
+
+
+@debug
+def changed():
+    # Moving the line below
+    return 1
+
+
+@debug
+def unchanged():
+    raise ValueError()
+'''
+
+COMPACT_MODULE_SOURCE = '''
+from ipdbugger import debug
+
+
+@debug(compact=True)
+def divide(values):
+    result = []
+    for value in values:
+        result.append(1 // value)
+        result.append(value)
+
+    return result
+'''
+
+MOVED_COMPACT_MODULE_SOURCE = '''
+from ipdbugger import debug
+# Moving the function below
+# by two lines
+
+
+@debug(compact=True)
+def divide(values):
+    result = []
+    for value in values:
+        result.append(1 // value)
+        result.append(value)
+
+    return result
+'''
+
+
+def write_module(path, source):
+    """Write the module's source, making sure its mtime changes."""
+    path.write(textwrap.dedent(source))
+    mtime = os.path.getmtime(str(path)) + 1
+    os.utime(str(path), (mtime, mtime))
+
+
+@pytest.fixture
+def watched_module(tmpdir, monkeypatch):
+    """Import a temporary module with instrumented functions."""
+    module_path = tmpdir.join("watched_module.py")
+    write_module(module_path, MODULE_SOURCE)
+    monkeypatch.syspath_prepend(str(tmpdir))
+
+    # Removing the module when undoing the patch
+    monkeypatch.delitem(sys.modules, "watched_module", raising=False)
+    return importlib.import_module("watched_module"), module_path
+
+
+def test_unchanged_file(watched_module):
+    """Test that nothing is re-instrumented if the file didn't change."""
+    module, module_path = watched_module
+    watcher = SourceWatcher()
+    watcher.watch(module)
+
+    write_module(module_path, MODULE_SOURCE)
+    assert watcher.check() == []
+
+
+def test_reinstrumenting_changed_function(watched_module):
+    """Test patching only the changed function, in place."""
+    module, module_path = watched_module
+    watcher = SourceWatcher()
+    watcher.watch(module)
+
+    unchanged_line = module.unchanged.__code__.co_firstlineno
+    write_module(module_path, CHANGED_MODULE_SOURCE)
+    assert watcher.check() == [module.changed]
+
+    # The unchanged function's lines were moved without recompiling it
+    assert module.unchanged.__code__.co_firstlineno == unchanged_line + 1
+
+    with patch('IPython.terminal.debugger.TerminalPdb.__init__'), \
+            patch('bdb.Bdb.set_trace') as set_trace:
+        module.changed()
+        assert set_trace.called
+
+
+def test_reinstrumenting_function_with_moved_body(watched_module):
+    """Test re-instrumenting a function whose body lines moved."""
+    module, module_path = watched_module
+    watcher = SourceWatcher()
+    watcher.watch(module)
+
+    write_module(module_path, BODY_CHANGED_MODULE_SOURCE)
+    assert watcher.check() == [module.changed]
+
+    return_line = textwrap.dedent(BODY_CHANGED_MODULE_SOURCE).splitlines() \
+        .index("    return 1") + 1
+    assert return_line in [line for _, line in
+                           dis.findlinestarts(module.changed.__code__)]
+    assert module.changed() == 1
+
+
+@pytest.mark.skipif(not ipdbugger.CAN_RESUME_INTO_TRY,
+                    reason="compact blocks require Python 3.11+")
+def test_resuming_in_moved_function(tmpdir, monkeypatch):
+    """Test resuming after a failure in a function moved without recompiling.
+    """
+    module_path = tmpdir.join("compact_module.py")
+    write_module(module_path, COMPACT_MODULE_SOURCE)
+    monkeypatch.syspath_prepend(str(tmpdir))
+    monkeypatch.delitem(sys.modules, "compact_module", raising=False)
+    module = importlib.import_module("compact_module")
+
+    watcher = SourceWatcher()
+    watcher.watch(module)
+    write_module(module_path, MOVED_COMPACT_MODULE_SOURCE)
+    assert watcher.check() == []
+
+    stopped_lines = []
+
+    def interaction(debugger, frame, _traceback):
+        stopped_lines.append(frame.f_lineno)
+        debugger.set_continue()
+
+    with patch.object(IPDBugger, 'interaction', interaction), \
+            patch('ipdbugger.traceback.format_exception', return_value=[]):
+        assert module.divide([1, 0]) == [1, 1, 0]
+
+    append_line = textwrap.dedent(MOVED_COMPACT_MODULE_SOURCE).splitlines() \
+        .index("        result.append(value)") + 1
+    assert stopped_lines == [append_line]
+
+
+def test_file_changed_between_watched_functions(watched_module):
+    """Test updating the watched functions when watching another one."""
+    module, module_path = watched_module
+    watcher = SourceWatcher()
+    watcher.watch(module.changed)
+
+    write_module(module_path, MODULE_SOURCE.replace(
+        "raise ValueError()", "return 2").replace("return 1", "return 3"))
+    watcher.watch(module.unchanged)
+
+    assert sorted(watcher.check(), key=lambda function: function.__name__) \
+        == [module.changed, module.unchanged]
+    assert module.changed() == 3
+    assert module.unchanged() == 2